@@ -1,5 +1,12 @@
+import csv
+import json
+import os
+import time
+from contextlib import contextmanager
+
 from opentrons import protocol_api
-from opentrons.protocol_api import COLUMN, ALL
+from opentrons.protocol_api import COLUMN, ALL, SINGLE
+from opentrons.protocols.parameters.exceptions import RuntimeParameterRequired
 
 #metadata
 metadata = {
@@ -12,62 +19,266 @@ metadata = {
 #load instrument specifics
 requirements = {"robotType": "Flex", "apiLevel": "2.22"}
 
-#all in one protocol starts here
-def run(protocol: protocol_api.ProtocolContext):
+#runtime parameters, shown in the app / on the touchscreen before a run
+def add_parameters(parameters: protocol_api.ParameterContext):
     
-    #custom well offset of 384, 1 results in lower  tip than 3.
-    well_height_sample = 1.2
-    well_height_wash = 14
+    #column mode: 12 COLUMN passes per reagent from the NEST 12 reservoir (use when reagent is limited)
+    #full mode: one 96 channel pass per reagent from a 96 well reagent plate (C2)
+    parameters.add_str(
+        display_name="Reagent dispensing",
+        variable_name="reagent_mode",
+        choices=[
+            {"display_name": "Column (12 passes)", "value": "column"},
+            {"display_name": "Full 96 head", "value": "full"},
+        ],
+        default="column",
+        description="Full 96 head stages each reagent in a 96 well reagent plate in " + DECK_LAYOUT["reagent_plate"] + ".",
+    )
     
-    #touch tip offset
-    touch_v_offset = -9.5
+    #which 96 source columns hold standards, samples, blanks (see sample_map_template.csv)
+    parameters.add_csv_file(
+        display_name="Sample map",
+        variable_name="sample_map",
+        description="Required on the robot: attach sample_map_template.csv or a CSV of column (1-12) and content.",
+    )
     
-    #rates
-    wash_rate = 3
-    sample_rate = 1
+    #droplet removal after each 7ul quadrant dispense, chosen per reagent
+    for reagent, display_name in TOUCH_REAGENTS:
+        parameters.add_str(
+            display_name=display_name + " touch",
+            variable_name="touch_" + reagent,
+            choices=TOUCH_CHOICES,
+            default="every",
+            description="Touch-tip policy after the 7ul dispenses of " + display_name.lower() + ".",
+        )
     
-    #touchtip well coverage
-    touchtip_ratio = 0.85
+    #liquid class (flow rates, settle delay, heights, touch position), chosen per reagent
+    for reagent, display_name in TOUCH_REAGENTS:
+        parameters.add_str(
+            display_name=display_name + " handling",
+            variable_name="class_" + reagent,
+            choices=LIQUID_CLASS_CHOICES,
+            default=LIQUID_CLASS_DEFAULTS[reagent],
+            description="Liquid class for " + display_name.lower() + ": flow rates, settle delay and heights.",
+        )
     
-    #loading of 96 well & 384 well plate    
-    source_plate = protocol.load_labware('corning_96_wellplate_360ul_flat', 'B2', label='Source Plate')
-    dest_plate = protocol.load_labware('agilent_384_wellplate_140ul', 'D1', label='Destination Plate')
+    #wash tips: 1000ul tips carry all washes of a step in one reservoir trip
+    parameters.add_str(
+        display_name="Wash tips",
+        variable_name="wash_tips",
+        choices=[
+            {"display_name": "200 ul", "value": "200"},
+            {"display_name": "1000 ul", "value": "1000"},
+        ],
+        default="200",
+        description="Tip rack in " + DECK_LAYOUT["wash_tips"] + " used for the prewet and the washes of steps 2 and 4.",
+    )
     
-    #loading of x12 and x1 reservoirs
-    small_reservoir = protocol.load_labware('nest_12_reservoir_15ml', 'A1', label='Small Reservoir')
-    wash_reservoir = protocol.load_labware('nest_1_reservoir_195ml', 'D2', label='Wash Buffer Reservoir')
+    #bead resuspension: 10x mix before every column (original), or one thorough mix up front and short remixes
+    parameters.add_str(
+        display_name="Bead mixing",
+        variable_name="bead_mixing",
+        choices=BEAD_MIXING_CHOICES,
+        default="every",
+        description="When the beads in the reservoir are mixed during the bead pass.",
+    )
+    parameters.add_int(
+        display_name="Bead remix every (s)",
+        variable_name="bead_remix_seconds",
+        default=90,
+        minimum=10,
+        maximum=900,
+        description="Time based bead mixing: longest estimated seconds from a mix to a bead aspirate.",
+    )
+    parameters.add_int(
+        display_name="Bead remix every (columns)",
+        variable_name="bead_remix_columns",
+        default=3,
+        minimum=1,
+        maximum=12,
+        description="Column based bead mixing: column groups served between short remixes.",
+    )
     
-    #load trash bin in deck slot A3
-    trash = protocol.load_trash_bin(location="A3")
+    #standard curve: diluted by hand at the bench (original), or a serial dilution built on deck down the standard column
+    parameters.add_str(
+        display_name="Standard curve",
+        variable_name="standard_prep",
+        choices=[
+            {"display_name": "Prepared at the bench", "value": "bench"},
+            {"display_name": "Serial dilution on deck", "value": "deck"},
+        ],
+        default="bench",
+        description="On deck: top standard in row A of the standard column, diluted down the rows by the robot.",
+    )
+    parameters.add_float(
+        display_name="Top standard (pg/ml)",
+        variable_name="standard_top",
+        default=10000.0,
+        minimum=1.0,
+        maximum=1000000.0,
+        description="Concentration of the top standard placed on deck, for the run plan.",
+    )
+    parameters.add_float(
+        display_name="Standard dilution factor",
+        variable_name="standard_factor",
+        default=4.0,
+        minimum=2.0,
+        maximum=10.0,
+        description="Each standard point is the previous one diluted 1:factor in assay buffer.",
+    )
+    parameters.add_int(
+        display_name="Standard points",
+        variable_name="standard_points",
+        default=7,
+        minimum=2,
+        maximum=8,
+        description="Points of the on deck standard curve from row A, the rows below get assay buffer only.",
+    )
+    
+    #incubations after steps 1-3: operator pause (original), timed delay on deck, or shaking on a Heater-Shaker under the 384 plate
+    #(offered only once its plate offset is measured, see HEATER_SHAKER_OFFSET_MEASURED)
+    incubation_choices = [
+        {"display_name": "Operator pause", "value": "pause"},
+        {"display_name": "Timed on deck", "value": "timer"},
+    ]
+    if HEATER_SHAKER_OFFSET_MEASURED:
+        incubation_choices.append({"display_name": "Heater-Shaker in " + DECK_LAYOUT["dest"], "value": "heater_shaker"})
+    parameters.add_str(
+        display_name="Incubation",
+        variable_name="incubation",
+        choices=incubation_choices,
+        default="pause",
+        description="Timed on deck: the plate stays on the deck, static, no shaking.",
+    )
+    
+    #validation (water) runs: same motion, short waits instead of pauses but the vacuum pauses, incubations in seconds, tips returned
+    parameters.add_str(
+        display_name="Run mode",
+        variable_name="run_mode",
+        choices=[
+            {"display_name": "Assay", "value": "assay"},
+            {"display_name": "Validation (water run)", "value": "validation"},
+        ],
+        default="assay",
+        description="Validation keeps vacuum pauses, shortens other pauses and incubations, returns full head tips.",
+    )
+    parameters.add_int(
+        display_name="Validation column groups",
+        variable_name="validation_groups",
+        default=12,
+        minimum=1,
+        maximum=12,
+        description="Column groups per reagent pass in a validation run, spread over the plate (12 = all).",
+    )
+    
+    #restart a stopped run from a checkpoint (the run log folder keeps the last one in checkpoint.json)
+    parameters.add_str(
+        display_name="Resume from",
+        variable_name="resume_from",
+        choices=RESUME_CHOICES,
+        default="start",
+        description="Skip everything before this part of a step, e.g. after a stopped run.",
+    )
+    parameters.add_int(
+        display_name="Resume at group / round",
+        variable_name="resume_index",
+        default=1,
+        minimum=1,
+        maximum=13,
+        description="First column group (reagents) or wash round (washes) to run of the part above.",
+    )
+    parameters.add_int(
+        display_name="Resume at plate",
+        variable_name="resume_plate",
+        default=1,
+        minimum=1,
+        maximum=len(PLATE_NAMES),
+        description="Plate of the batch to resume (1 = A), ignored for single plate runs.",
+    )
+    
+    #more than one plate: steps of the next plate run while the others incubate
+    parameters.add_int(
+        display_name="Plates in batch",
+        variable_name="plate_count",
+        default=1,
+        minimum=1,
+        maximum=len(PLATE_NAMES),
+        description="Plates processed in one run, interleaved during the incubations.",
+    )
+
+#region deck layout - slot of every labware
+##################################################################################
+##################################################################################
+#every load in run() takes its slot from here, legendplex_layout.py searches for maps with less gantry travel
+#reagent_tips: slots of the 50ul reagent racks, in order of use
+#the trash bin and the 384 plate (it can sit on the heater-shaker) need a slot in column 1 or 3
+DECK_LAYOUT = {
+    "reservoir": "A1",
+    "sample_tips": "A2",
+    "trash": "A3",
+    "reagent_tips": ["B1", "C1", "B3", "C3"],
+    "source": "B2",
+    "reagent_plate": "C2",
+    "dest": "D1",
+    "wash": "D2",
+    "wash_tips": "D3",
+}
+#endregion
+
+#region plate layout - sample map > 96>384 quadrant map
+##################################################################################
+##################################################################################
+#what a 96 source column can hold
+SAMPLE_MAP_CONTENTS = ("standard", "sample", "blank", "empty")
+
+#no sample map attached: standards in column 1, samples in columns 2-12 (full plate)
+FULL_PLATE_MAP = {column: ("standard" if column == 1 else "sample") for column in range(1, 13)}
 
-    #load of tips on racks no adapter for partials
-    tips_1 = protocol.load_labware("opentrons_flex_96_filtertiprack_50ul", "B1")    
-    partial_tip_racks_initial = [tips_1]
-    tips_2 = protocol.load_labware("opentrons_flex_96_filtertiprack_50ul", "C1")
-    partial_tip_racks_secondary = [tips_2]
-    tips_3 = protocol.load_labware("opentrons_flex_96_filtertiprack_50ul", "B3")
-    partial_tip_racks_tertiary = [tips_3]
-    tips_4 = protocol.load_labware("opentrons_flex_96_filtertiprack_50ul", "C3")
-    partial_tip_racks_quaternary = [tips_4]
+#read the sample map csv text into {source column: content}, columns not listed are empty
+def parse_sample_map(text):
     
+    sample_map = {column: "empty" for column in range(1, 13)}
+    for row in csv.reader(text.splitlines()):
+        cells = [cell.strip() for cell in row]
+        #skip blank lines, comments and the header row
+        if not cells or not cells[0] or cells[0].startswith("#") or not cells[0].isdigit():
+            continue
+        column = int(cells[0])
+        content = cells[1].lower() if len(cells) > 1 and cells[1] else "empty"
+        if column not in sample_map:
+            raise ValueError("Sample map column " + str(column) + " is outside 1-12")
+        if content not in SAMPLE_MAP_CONTENTS:
+            raise ValueError("Sample map column " + str(column) + " has unknown content '" + content + "'")
+        sample_map[column] = content
+    return sample_map
+
+#sample map from the runtime parameter; the app will not start a run without the file, only a simulation or analysis
+#with no file attached (e.g. opentrons.simulate) falls back to a full plate, standards in column 1 and samples in 2-12
+def read_sample_map(csv_file):
     
-    #load of tips on racks with adapter with adapter for full plate load
-    tips_5 = protocol.load_labware("opentrons_flex_96_filtertiprack_50ul", "A2", adapter="opentrons_flex_96_tiprack_adapter") 
-    tips_6 = protocol.load_labware("opentrons_flex_96_filtertiprack_200ul", "D3",adapter="opentrons_flex_96_tiprack_adapter") 
-    full_tip_racks = [tips_5]  # Add the other tip racks here
-    full_tip_racks_wash = [tips_6]  # Add the other tip racks here
+    try:
+        text = csv_file.contents if csv_file is not None else None
+    except RuntimeParameterRequired:
+        text = None
+    if text is None:
+        return dict(FULL_PLATE_MAP)
+    return parse_sample_map(text)
 
-    #load pipette, note tips not attached
-    pipette = protocol.load_instrument('flex_96channel_1000','left')
+#snippet to do quadrant pipetting 96>384
+#ordering is the labware definition ordering (list of 384 columns, top to bottom), see Agilent_384_Well_Plate.json
+def generate_384_well_groups(source_columns=range(1, 13), ordering=None):
     
-    #snippet to do quadrant pipetting 96>384
-    def generate_384_well_groups():
-        
-        # Create empty list to store all well groups
-        well_groups = []
+    # Create empty list to store all well groups
+    well_groups = []
     
-        # Iterate through 12 column pairs (1-2, 3-4, ..., 23-24)
-        for col in range(1, 24, 2):  # Start at 1, increment by 2 to get odd columns
+    # 96 source column c lands in 384 columns 2c-1 and 2c
+    for source_column in source_columns:
+        col = 2 * source_column - 1
+        if ordering is not None:
+            # Create the group of 4 wells in the pattern A1, A2, B1, B2 from the plate definition
+            left, right = ordering[col - 1], ordering[col]
+            well_group = [left[0], right[0], left[1], right[1]]
+        else:
             # Create the group of 4 wells in the pattern A1, A2, B1, B2
             well_group = [
                 f"A{col}",    # e.g., A1
@@ -76,381 +287,1265 @@ def run(protocol: protocol_api.ProtocolContext):
                 f"B{col+1}"   # e.g., B2
             ]
         
-            # Add this group to our list
-            well_groups.append(well_group)
+        # Add this group to our list
+        well_groups.append(well_group)
     
-        return well_groups
+    return well_groups
 
-#region step 1 - prewet, buffer, sample 96>384 aliquot, bead mix/aliquot
+#96>384 quadrant map for one plate, worked out once from the sample map
+class PlateLayout:
+    
+    def __init__(self, sample_map, ordering=None):
+        self.sample_map = dict(sample_map)
+        occupied = [column for column in sorted(self.sample_map) if self.sample_map[column] != "empty"]
+        if not occupied:
+            raise ValueError("The sample map has no standard, sample or blank column, there is nothing to run (see sample_map_template.csv)")
+        self.groups = dict(zip(occupied, generate_384_well_groups(occupied, ordering)))
+        #resolved .bottom(z=...) locations, keyed by (well, z)
+        self._locations = {}
+    
+    #well groups (in column order) whose source column holds one of the given contents
+    def groups_for(self, *contents):
+        return [group for column, group in self.groups.items() if self.sample_map[column] in contents]
+    
+    def occupied_groups(self):
+        return list(self.groups.values())
+    
+    def count(self, content):
+        return sum(1 for value in self.sample_map.values() if value == content)
+    
+    #cached plate[well].bottom(z=z)
+    def location(self, plate, well, z):
+        key = (well, z)
+        if key not in self._locations:
+            self._locations[key] = plate[well].bottom(z=z)
+        return self._locations[key]
+    
+    def summary(self):
+        return ("Plate layout: " + str(self.count("standard")) + " standard, " + str(self.count("sample"))
+                + " sample, " + str(self.count("blank")) + " blank column(s), "
+                + str(len(self.groups)) + " of 12 column groups occupied")
+#endregion
+
+#region droplet removal - touch tip strategies
+##################################################################################
+##################################################################################
+#when: touch after "every" dispense, the "last" quadrant only, or "never"
+#speed: touch tip speed in mm/s (the API allows up to 80)
+#air_gap: ul of air drawn back after each dispense to hold the droplet in the tip instead of touching
+TOUCH_STRATEGIES = {
+    "every": {"when": "every", "speed": 30.0, "air_gap": 0},
+    "last": {"when": "last", "speed": 30.0, "air_gap": 0},
+    "fast": {"when": "every", "speed": 80.0, "air_gap": 0},
+    "air_gap": {"when": "never", "speed": 0.0, "air_gap": 2},
+    "none": {"when": "never", "speed": 0.0, "air_gap": 0},
+}
+
+TOUCH_CHOICES = [
+    {"display_name": "Every dispense (30 mm/s)", "value": "every"},
+    {"display_name": "Last quadrant only", "value": "last"},
+    {"display_name": "Every dispense (80 mm/s)", "value": "fast"},
+    {"display_name": "Air gap, no touch", "value": "air_gap"},
+    {"display_name": "None", "value": "none"},
+]
+
+#reagents with 7ul quadrant dispenses (runtime parameter touch_<reagent>)
+TOUCH_REAGENTS = [
+    ("matrix", "Matrix"),
+    ("buffer", "Assay buffer"),
+    ("sample", "Sample"),
+    ("beads", "Beads"),
+    ("detection", "Detection antibody"),
+    ("sape", "SA-PE"),
+]
+#endregion
+
+#region liquid classes - flow rates, settle delay, heights and touch position per reagent
+##################################################################################
+##################################################################################
+#aspirate_rate / dispense_rate: multiples of the pipette's flow rates
+#delay: seconds the tip stays in the source after aspirating, so the liquid settles before moving
+#aspirate_height / dispense_height: mm above the well bottom, None takes the labware height from LABWARE_HEIGHTS
+#touch_v_offset / touch_radius: where touch-tips run (when and how fast come from the touch setting)
+#standard is the original reagent handling, aqueous suits plain buffers, viscous serum-like matrix
+LIQUID_CLASSES = {
+    "aqueous": {"aspirate_rate": 1.0, "dispense_rate": 1.0, "delay": 0, "aspirate_height": None, "dispense_height": None, "touch_v_offset": -9.5, "touch_radius": 0.85},
+    "standard": {"aspirate_rate": 0.5, "dispense_rate": 1.0, "delay": 1, "aspirate_height": None, "dispense_height": None, "touch_v_offset": -9.5, "touch_radius": 0.85},
+    #assay buffer as the original protocol handled it
+    "buffer": {"aspirate_rate": 0.5, "dispense_rate": 0.5, "delay": 1, "aspirate_height": None, "dispense_height": None, "touch_v_offset": -9.5, "touch_radius": 0.85},
+    "viscous": {"aspirate_rate": 0.5, "dispense_rate": 0.5, "delay": 2, "aspirate_height": None, "dispense_height": None, "touch_v_offset": -9.5, "touch_radius": 0.85},
+    "sample": {"aspirate_rate": 1.0, "dispense_rate": 1.0, "delay": 5, "aspirate_height": None, "dispense_height": None, "touch_v_offset": -9.5, "touch_radius": 0.85},
+    #wash buffer goes in high (14mm) and fast so it does not disturb the beads
+    "wash": {"aspirate_rate": 1.0, "dispense_rate": 3.0, "delay": 0, "aspirate_height": None, "dispense_height": 14, "touch_v_offset": -9.5, "touch_radius": 0.85},
+}
+
+#default aspirate / dispense heights per labware, mm above the well bottom
+#custom well offset of 384, 1 results in lower tip than 3
+LABWARE_HEIGHTS = {
+    "nest_12_reservoir_15ml": {"aspirate": 1.0, "dispense": 1.0},
+    "nest_1_reservoir_195ml": {"aspirate": 1.0, "dispense": 1.0},
+    "corning_96_wellplate_360ul_flat": {"aspirate": 1.0, "dispense": 1.0},
+    "agilent_384_wellplate_140ul": {"aspirate": 1.0, "dispense": 1.2},
+}
+
+LIQUID_CLASS_CHOICES = [
+    {"display_name": "Aqueous (full speed)", "value": "aqueous"},
+    {"display_name": "Standard (0.5x aspirate, 1 s)", "value": "standard"},
+    {"display_name": "Buffer (0.5x both, 1 s)", "value": "buffer"},
+    {"display_name": "Viscous (0.5x both, 2 s)", "value": "viscous"},
+    {"display_name": "Sample (5 s settle)", "value": "sample"},
+]
+
+#liquid class of each reagent (runtime parameter class_<reagent>); the washes always use "wash"
+#assay buffer keeps its original 0.5x aspirate and dispense (matrix, the same step, dispensed at 1), aqueous is opt-in
+LIQUID_CLASS_DEFAULTS = {
+    "matrix": "standard",
+    "buffer": "buffer",
+    "sample": "sample",
+    "beads": "standard",
+    "detection": "standard",
+    "sape": "standard",
+}
+
+#ul aspirated per tip load, 4 x 7ul is delivered and the rest stays in the tip (pre-wetting losses, last dispense accuracy)
+#the full mode matrix + assay buffer pass draws the matrix volume
+ASPIRATE_VOLUMES = {
+    "matrix": 35,
+    "buffer": 50,
+    "sample": 45,
+    "beads": 30,
+    "detection": 30,
+    "sape": 30,
+}
+
+#one liquid class resolved for a source and a destination labware (load names)
+def liquid_class(name, source, dest):
+    profile = dict(LIQUID_CLASSES[name], name=name)
+    if profile["aspirate_height"] is None:
+        profile["aspirate_height"] = LABWARE_HEIGHTS[source]["aspirate"]
+    if profile["dispense_height"] is None:
+        profile["dispense_height"] = LABWARE_HEIGHTS[dest]["dispense"]
+    return profile
+
+#one line description of the liquid class of every reagent, for the run log
+def liquid_class_summary(classes):
+    return "Liquid classes: " + "; ".join(
+        reagent + " " + profile["name"] + " (aspirate " + str(profile["aspirate_rate"]) + "x at " + str(profile["aspirate_height"]) + "mm, "
+        + str(profile["delay"]) + " s, dispense " + str(profile["dispense_rate"]) + "x at " + str(profile["dispense_height"]) + "mm)"
+        for reagent, profile in classes.items())
+#endregion
+
+#region bead mixing - resuspension of the beads in the reservoir during the bead pass
+##################################################################################
+##################################################################################
+#mix volume (ul) and cycles: every = before each column group (original), first = the up front mix, remix = the short remixes
+BEAD_MIX = {"volume": 30, "every": 10, "first": 15, "remix": 3}
+
+#seconds of one bead column group without its mix, fitted to legendplex_timing: fixed = pickup, moves and drop,
+#touch = one touch-tip (plus touch_path mm at the touch speed), air_gap = one air gap, flow_rate = ul/s at rate 1
+BEAD_GROUP_SECONDS = {"fixed": 26.1, "touch": 1.9, "touch_path": 8.4, "air_gap": 0.4, "flow_rate": 160}
+
+BEAD_MIXING_CHOICES = [
+    {"display_name": "Before every column (10x)", "value": "every"},
+    {"display_name": "Up front, remix by time", "value": "seconds"},
+    {"display_name": "Up front, remix by columns", "value": "columns"},
+]
+
+#estimated seconds of one bead column group (4 x 7ul) with the selected touch strategy and liquid class, mix not included
+def bead_group_seconds(touch, profile, aspirate_volume=ASPIRATE_VOLUMES["beads"]):
+    times = BEAD_GROUP_SECONDS
+    touches = {"every": 4, "last": 1, "never": 0}[touch["when"]]
+    touch_seconds = touches * (times["touch"] + times["touch_path"] / touch["speed"]) if touches else 0
+    air_gap_seconds = 4 * times["air_gap"] if touch["air_gap"] else 0
+    flow_seconds = aspirate_volume / (times["flow_rate"] * profile["aspirate_rate"]) + 4 * 7 / (times["flow_rate"] * profile["dispense_rate"])
+    return times["fixed"] + touch_seconds + air_gap_seconds + flow_seconds + profile["delay"]
+
+#mix cycles before each of count column groups (0 = no mix), worked out before the run so the robot and the simulation move the same
+#seconds: remix before a group whose aspirate would come more than remix_seconds after the last mix, group_seconds apart
+def plan_bead_mixing(count, strategy, remix_seconds=90, remix_columns=3, group_seconds=None):
+    if strategy == "every":
+        return [BEAD_MIX["every"]] * count
+    if group_seconds is None:
+        group_seconds = bead_group_seconds(TOUCH_STRATEGIES["every"], LIQUID_CLASSES[LIQUID_CLASS_DEFAULTS["beads"]])
+    cycles = []
+    since_mix = 0
+    for n in range(count):
+        if n == 0:
+            cycles.append(BEAD_MIX["first"])
+            since_mix = 0
+        elif (strategy == "columns" and n % remix_columns == 0) or (strategy == "seconds" and since_mix > remix_seconds):
+            cycles.append(BEAD_MIX["remix"])
+            since_mix = 0
+        else:
+            cycles.append(0)
+        since_mix += group_seconds
+    return cycles
+
+#one line description of a bead mixing plan, for the run log
+def bead_mixing_summary(cycles):
+    if len(set(cycles)) == 1:
+        mixes = str(cycles[0]) + "x before every column group"
+    else:
+        mixes = ", ".join(str(count) + "x before group " + str(n) for n, count in enumerate(cycles, 1) if count)
+    return "Bead mixing: " + mixes + " (" + str(sum(cycles)) + " cycles in total)."
+#endregion
+
+#region standard curve - serial dilution on deck
+##################################################################################
+##################################################################################
+#the series is built down rows A-H of each standard column of the sample plate, as at the bench, so the 96 channel
+#sample transfer carries every point into its 4 quadrant wells of the standard column group
+#single tips (A1 nozzle): the head hangs to the right and to the front of the tip, so it reaches source columns 1-3
+#and the first columns of the reagent plate slot, but not the NEST 12; the assay buffer for the series sits in a
+#second NEST 12 in the reagent plate slot (free in column mode)
+STANDARD_BUFFER_RESERVOIR = "nest_12_reservoir_15ml"
+STANDARD_REACH_COLUMNS = 3
+STANDARD_ROWS = "ABCDEFGH"
+
+#well_volume: ul every standard well keeps (the sample transfer mixes 25ul and draws 45ul), the top standard needs
+#well_volume + transfer; tip_volume: most ul per single tip trip; mix: mix volume as a fraction of the well, at least
+#min_cycles and enough cycles to turn the well over mix_turnovers times; buffer_dead: ul left in the buffer reservoir well
+STANDARD_PREP = {"well_volume": 60, "tip_volume": 45, "mix_fraction": 0.8, "min_cycles": 5, "mix_turnovers": 3, "buffer_dead": 800}
+
+#estimated seconds of the stage (fixed part and per point) for one standard column, from legendplex_timing
+STANDARD_SECONDS = {"fixed": 117, "per_point": 33.5}
+
+#volumes of the single tip trips that move volume ul, no trip above the tip volume
+def split_volume(volume, most=STANDARD_PREP["tip_volume"]):
+    trips = int(-(-volume // most))
+    return [round(volume / trips, 1)] * trips
+
+#the serial dilution of one plate: concentration of every row (rows after the last point keep assay buffer only,
+#the 0 point), transfer and mix volumes, assay buffer and tips
+#columns: source columns of the standard columns in the sample map
+def plan_standards(points, top, factor, columns):
+    if not columns:
+        raise ValueError("The on deck standard curve needs a standard column in the sample map")
+    if max(columns) > STANDARD_REACH_COLUMNS:
+        raise ValueError("The on deck standard curve is built with single tips, which reach source columns 1-" + str(STANDARD_REACH_COLUMNS) + " only, the sample map has a standard column in " + str(max(columns)))
+    if not 2 <= points <= len(STANDARD_ROWS):
+        raise ValueError(str(points) + " standard points do not fit the " + str(len(STANDARD_ROWS)) + " rows of a standard column")
+    well_volume = STANDARD_PREP["well_volume"]
+    transfer = round(well_volume / (factor - 1), 1)
+    mix_volume = min(round(STANDARD_PREP["mix_fraction"] * (well_volume + transfer), 1), STANDARD_PREP["tip_volume"])
+    mix_cycles = max(STANDARD_PREP["min_cycles"], -(-int(STANDARD_PREP["mix_turnovers"] * (well_volume + transfer)) // int(mix_volume)))
+    return {
+        "columns": list(columns),
+        "rows": [{"row": row, "concentration": top / factor ** n if n < points else 0.0} for n, row in enumerate(STANDARD_ROWS)],
+        "points": points,
+        "factor": factor,
+        "well_volume": well_volume,
+        "transfer": transfer,
+        "top_volume": round(well_volume + transfer, 1),
+        "buffer_trips": split_volume(well_volume),
+        "transfer_trips": split_volume(transfer),
+        "buffer_volume": (len(STANDARD_ROWS) - 1) * well_volume * len(columns) + STANDARD_PREP["buffer_dead"],
+        "mix_volume": mix_volume,
+        "mix_cycles": mix_cycles,
+        #one tip for the assay buffer, one per transfer
+        "tips": points * len(columns),
+        "seconds": (STANDARD_SECONDS["fixed"] + STANDARD_SECONDS["per_point"] * points) * len(columns),
+    }
+
+#one line description of a standard curve plan, for the run log
+def standard_plan_summary(plan, slot):
+    return ("Standard curve on deck: " + str(plan["points"]) + " points 1:" + str(plan["factor"]) + " from " + str(round(plan["rows"][0]["concentration"], 1))
+            + " to " + str(round(plan["rows"][plan["points"] - 1]["concentration"], 2)) + " pg/ml down rows A-" + STANDARD_ROWS[plan["points"] - 1]
+            + (", assay buffer only in row(s) " + STANDARD_ROWS[plan["points"]:] if plan["points"] < len(STANDARD_ROWS) else "")
+            + " of source column(s) " + ", ".join(str(column) for column in plan["columns"]) + ", top standard " + str(plan["top_volume"]) + "ul in row A, "
+            + str(round(plan["buffer_volume"] / 1000, 2)) + " ml assay buffer in A1 of the reservoir in " + slot + ", "
+            + str(plan["transfer"]) + "ul carried into " + str(plan["well_volume"]) + "ul and mixed " + str(plan["mix_cycles"]) + "x " + str(plan["mix_volume"]) + "ul, "
+            + str(plan["tips"]) + " single tips, about " + str(round(plan["seconds"] / 60, 1)) + " min")
+#endregion
+
+#region wash planning - fewest wash reservoir trips per wash
 ##################################################################################
 ##################################################################################
-    protocol.comment("STEP 1 commencing. This step prewets the plate with wash tips, awaits filtrations, and then aluiquots required reagents into the appropriate well. It is setup for 96>384 well processing but can be modified as required).")
+#wash tip racks by tip volume
+WASH_TIPRACKS = {"200": "opentrons_flex_96_filtertiprack_200ul", "1000": "opentrons_flex_96_filtertiprack_1000ul"}
+
+#share of the tip filled per trip (180ul of a 200ul tip, as the original washes)
+WASH_TIP_FILL = 0.9
+
+#the 96 head washes the 4 quadrants of the 384 plate in this order
+WASH_QUADRANTS = ["A1", "A2", "B1", "B2"]
+
+#plan a wash: `cycles` rounds of one dispense per quadrant (vacuum in between) and an optional final
+#resuspension round that is not vacuumed. Each reservoir trip loads as many of the dispenses, in order,
+#as the tip holds next to the pre-dispense and the residual kept in the tip, which is the fewest trips.
+#aspirate is what to draw on the trip: the residual of the previous trip is still in the tip
+#rinse: first load and blow out a full trip to clean the tips (prewet)
+def plan_wash(cycles, well_volume, tip_volume, final_volume=0, predispense=10, residual=10, rinse=False):
+    capacity = tip_volume * WASH_TIP_FILL
+    dispenses = [(cycle, quadrant, well_volume) for cycle in range(1, cycles + 1) for quadrant in range(len(WASH_QUADRANTS))]
+    if final_volume:
+        dispenses += [(cycles + 1, quadrant, final_volume) for quadrant in range(len(WASH_QUADRANTS))]
+    trips = []
+    for cycle, quadrant, volume in dispenses:
+        if predispense + volume + residual > capacity:
+            raise ValueError("A " + str(volume) + "ul wash dispense does not fit a " + str(tip_volume) + "ul tip")
+        if not trips or predispense + trips[-1]["volume"] + volume + residual > capacity:
+            trips.append({"dispenses": [], "volume": 0})
+        trips[-1]["dispenses"].append((cycle, quadrant, volume))
+        trips[-1]["volume"] += volume
+    carried = 0
+    for trip in trips:
+        trip["load"] = predispense + trip["volume"] + residual
+        trip["aspirate"] = trip["load"] - carried
+        carried = residual
+    rinse_volume = trips[0]["load"] if rinse else 0
+    return {
+        "cycles": cycles,
+        "well_volume": well_volume,
+        "final_volume": final_volume,
+        "tip_volume": tip_volume,
+        "predispense": predispense,
+        "residual": residual,
+        "rinse": rinse_volume,
+        "trips": trips,
+        "reservoir_volume": (rinse_volume + sum(trip["aspirate"] for trip in trips)) * 96,
+    }
+
+#the washes of one plate: prewet (one round after a rinse), step 2 (4 washes), step 4 (4 washes + 20ul resuspension)
+def wash_plans(tip_volume):
+    return {
+        "prewet": plan_wash(1, 40, tip_volume, rinse=True),
+        "step 2": plan_wash(4, 40, tip_volume),
+        "step 4": plan_wash(4, 40, tip_volume, final_volume=20),
+    }
+
+#the rounds of a wash plan from first_round on (resumed run), replanned so the first trip loads only what is left
+#rounds keep their numbers, the final resuspension is round cycles + 1; None when no round is left
+def resume_wash(plan, first_round):
+    if first_round <= 1:
+        return plan
+    if first_round > plan["cycles"] + (1 if plan["final_volume"] else 0):
+        return None
+    resumed = plan_wash(max(plan["cycles"] - first_round + 1, 0), plan["well_volume"], plan["tip_volume"], plan["final_volume"], plan["predispense"], plan["residual"])
+    for trip in resumed["trips"]:
+        trip["dispenses"] = [(cycle + first_round - 1, quadrant, volume) for cycle, quadrant, volume in trip["dispenses"]]
+    resumed["cycles"] = plan["cycles"]
+    resumed["first_round"] = first_round
+    return resumed
+
+#one line description of a wash plan, for the run log
+def wash_plan_summary(plan):
+    text = "Wash plan: " + str(plan["cycles"]) + " x 4x" + str(plan["well_volume"]) + "ul"
+    if plan["final_volume"]:
+        text += " + final 4x" + str(plan["final_volume"]) + "ul"
+    if plan.get("first_round", 1) > 1:
+        text += ", resumed at round " + str(plan["first_round"])
+    if plan["rinse"]:
+        text += " after a " + str(plan["rinse"]) + "ul rinse"
+    text += ", " + str(plan["tip_volume"]) + "ul tips, " + str(len(plan["trips"])) + " reservoir trip(s), aspirating "
+    text += "/".join(str(round(trip["aspirate"], 1)) for trip in plan["trips"]) + "ul, "
+    return text + str(round(plan["reservoir_volume"] / 1000, 1)) + " ml of wash buffer"
+#endregion
+
+#region tip planning - 50ul reagent racks worked out before the run
+##################################################################################
+##################################################################################
+#50ul reagent passes of one plate in run order: (step, reagent, sample map contents it goes to)
+#full mode adds matrix and assay buffer in one pass, listed as buffer; standards is the on deck standard curve
+REAGENT_PASSES = [
+    (1, "matrix", ("standard",)),
+    (1, "buffer", ("sample", "blank")),
+    (1, "standards", ("standard",)),
+    (1, "beads", ("standard", "sample", "blank")),
+    (2, "detection", ("standard", "sample", "blank")),
+    (3, "sape", ("standard", "sample", "blank")),
+]
+
+#COLUMN layouts: the head body hangs over the neighbouring slot on the side of the unused nozzles
+#(A1 start: the slot to the right, A12 start: the slot to the left), checked per slot not per mm
+NOZZLE_SIDE = {"A12": -1, "A1": 1}
+
+def neighbour_slot(slot, side):
+    column = int(slot[1]) + side
+    return slot[0] + str(column) if 1 <= column <= 3 else None
+
+#(slot, neighbour) pairs where a COLUMN pass with this start would hang the head over a tip rack
+def find_clashes(slots, start, rack_slots):
+    return [(slot, neighbour_slot(slot, NOZZLE_SIDE[start])) for slot in slots if neighbour_slot(slot, NOZZLE_SIDE[start]) in rack_slots]
+
+#SINGLE layout (A1 nozzle, on deck standard curve): the head hangs over the slot to the right and the slot in front,
+#the racks in the way of a single tip pickup from this slot (a slot in column 3 or row D puts the head past the deck edge)
+#first_columns: only the first STANDARD_REACH_COLUMNS columns of the slot are visited (source standard columns, buffer
+#well A1), where a rack on the right is still clear of the head
+def single_clashes(slot, rack_slots, first_columns=False):
+    right = neighbour_slot(slot, 1)
+    if right is None or slot[0] == "D":
+        return ["deck edge"]
+    front = "ABCD"["ABCD".index(slot[0]) + 1] + slot[1]
+    return [neighbour for neighbour in ((front,) if first_columns else (right, front)) if neighbour in rack_slots]
+
+#plan the 50ul reagent racks of one plate: the fewest racks (reagents share racks, no reset between steps),
+#a nozzle start per pass that clears every tip rack on deck, and the rack column of every pickup
+#deck: slots of the reagent racks, the other racks (sample, wash), the NEST and the 384 plate
+#separate_steps: each step starts on its own rack, so a batch refreshes the racks of one step only
+#standards: add the single tips of the on deck standard curve (column mode), one rack column per standard column;
+#when the racks have no column to spare they come from a rack that is replaced at the bead pause (refresh)
+def plan_tips(layout, reagent_mode, deck=DECK_LAYOUT, separate_steps=False, standards=False):
+    if reagent_mode == "full":
+        passes = [{"step": step, "reagent": reagent, "columns": 12} for step, reagent, _ in REAGENT_PASSES if reagent not in ("matrix", "standards")]
+    else:
+        passes = [{"step": step, "reagent": reagent, "columns": len(layout.groups_for(*contents))} for step, reagent, contents in REAGENT_PASSES]
+        passes = [reagent_pass for reagent_pass in passes if reagent_pass["columns"] and (standards or reagent_pass["reagent"] != "standards")]
     
-    #set flex to 96 well and tips wash
-    pipette.configure_nozzle_layout(
-    style=ALL,
-    start="A1",
-    tip_racks=full_tip_racks_wash
-    )
-     
-    #pick up full tips for wasing - 200ul
-    pipette.pick_up_tip()
-    #Aspirate 200ul from the source plate (96-well) into the pipette tip
-    pipette.aspirate(180, wash_reservoir['A1'])  
-    protocol.comment("cleaning, waiting 30 seconds")
-    #blow out the remaining liquid in the tip
-    pipette.blow_out(trash)
-    #Aspirate 200ul from the source plate (96-well) into the pipette tip
-    pipette.aspirate(180, wash_reservoir['A1'])  
-    #pre-dispense 10
-    pipette.dispense(10, wash_reservoir['A1'])  
-    
-    #dispense sequentially to all 4 quadrants    
-    pipette.dispense(40, dest_plate['A1'].bottom(z=well_height_wash), rate=wash_rate)  # Top-left quadrant
-    pipette.dispense(40, dest_plate['A2'].bottom(z=well_height_wash), rate=wash_rate)  # Top-left quadrant
-    pipette.dispense(40, dest_plate['B1'].bottom(z=well_height_wash), rate=wash_rate)  # Top-left quadrant
-    pipette.dispense(40, dest_plate['B2'].bottom(z=well_height_wash), rate=wash_rate)  # Top-left quadrant
-    
-    #blow out the remaining liquid in the tip
-    pipette.blow_out(trash)  
-    
-    #return wash tips
-    pipette.return_tip()    
-
-    #wait for user to vaccum
-    protocol.pause("Place is wetted. Wait 1+ minute, then vacuum and return for addition of next compnents of the assay. Then click 'Resume' to continue.")
-
-    #set flex to column pickup
-    pipette.configure_nozzle_layout(
-        style=COLUMN,
-        start="A1",
-        tip_racks=partial_tip_racks_initial    
-        )
+    #full mode: one whole rack per pass; column mode: passes fill racks one after the other
+    refresh = False
+    if reagent_mode == "full":
+        rack_count = len(passes)
+    elif separate_steps:
+        rack_count = sum(-(-sum(reagent_pass["columns"] for reagent_pass in passes if reagent_pass["step"] == step) // 12) for step in {reagent_pass["step"] for reagent_pass in passes})
+    else:
+        rack_count = -(-sum(reagent_pass["columns"] for reagent_pass in passes) // 12)
+        column_count = -(-sum(reagent_pass["columns"] for reagent_pass in passes if reagent_pass["reagent"] != "standards") // 12)
+        if rack_count > len(deck["reagent_tips"]) >= column_count:
+            rack_count, refresh = column_count, True
+    if rack_count > len(deck["reagent_tips"]):
+        raise ValueError("The reagent passes need " + str(rack_count) + " racks of 50ul tips, there are slots for " + str(len(deck["reagent_tips"])))
+    racks = deck["reagent_tips"][:rack_count]
+    all_racks = set(racks) | {deck["sample_tips"], deck["wash_tips"]}
+    
+    #free columns left in each rack: A12 starts take from the left, A1 starts from the right
+    free = {slot: [1, 12] for slot in racks}
+    clashes = []
+    for n, reagent_pass in enumerate(passes):
+        if reagent_mode == "full":
+            reagent_pass["start"] = "A1"
+            reagent_pass["picks"] = [(racks[n], 1)]
+            free[racks[n]] = [13, 12]
+            continue
+        #on deck standard curve: single tips from the right of a rack the head can reach, an untouched rack when it is refreshed
+        if reagent_pass["reagent"] == "standards":
+            reagent_pass["start"] = "A1"
+            #the series is built in the source plate with assay buffer from the reagent plate slot
+            clashes += [("standards", slot, neighbour) for slot in (deck["source"], deck["reagent_plate"]) for neighbour in single_clashes(slot, all_racks, first_columns=True)]
+            reach = [slot for slot in racks if not single_clashes(slot, all_racks) and (not refresh or free[slot] == [1, 12])]
+            slot = next((slot for slot in reach if free[slot][1] - free[slot][0] + 1 >= reagent_pass["columns"]), None)
+            if slot is None:
+                clashes += [("standards", slot, neighbour) for slot in racks for neighbour in single_clashes(slot, all_racks)]
+                reagent_pass["picks"] = []
+                continue
+            reagent_pass["picks"] = [(slot, free[slot][1] - k) for k in range(reagent_pass["columns"])]
+            if refresh:
+                reagent_pass["refresh"] = slot
+            else:
+                free[slot][1] -= reagent_pass["columns"]
+            continue
+        #a new step closes the racks used so far
+        if separate_steps and n and reagent_pass["step"] != passes[n - 1]["step"]:
+            free = {slot: ([13, 12] if window != [1, 12] else window) for slot, window in free.items()}
+        for start in NOZZLE_SIDE:
+            #columns this pass would take with this start, rack by rack
+            picks = []
+            window = {slot: list(free[slot]) for slot in racks}
+            for slot in racks:
+                while window[slot][0] <= window[slot][1] and len(picks) < reagent_pass["columns"]:
+                    if start == "A12":
+                        picks.append((slot, window[slot][0]))
+                        window[slot][0] += 1
+                    else:
+                        picks.append((slot, window[slot][1]))
+                        window[slot][1] -= 1
+            pass_clashes = find_clashes(sorted({slot for slot, _ in picks}) + [deck["reservoir"], deck["dest"]], start, all_racks)
+            if not pass_clashes:
+                break
+        else:
+            clashes += [(reagent_pass["reagent"], slot, neighbour) for slot, neighbour in pass_clashes]
+        reagent_pass["start"] = start
+        reagent_pass["picks"] = picks
+        free = window
+    
+    used = {slot: 0 for slot in racks}
+    for reagent_pass in passes:
+        for slot, _ in reagent_pass["picks"]:
+            used[slot] += 12 if reagent_mode == "full" else 1
+    return {
+        "mode": reagent_mode,
+        "racks": racks,
+        "passes": passes,
+        "columns_used": used,
+        "tips": sum(used.values()) * 8,
+        "clashes": clashes,
+        #rack replaced at the bead pause, after the standard curve took its single tips
+        "refresh": next((reagent_pass["refresh"] for reagent_pass in passes if "refresh" in reagent_pass), None),
+    }
+
+#one line description of a tip plan, for the run log
+def tip_plan_summary(plan):
+    text = "Tip plan: " + str(len(plan["racks"])) + " rack(s) of 50ul reagent tips, "
+    text += "; ".join(slot + " " + ", ".join(reagent_pass["reagent"] + " " + str(len([pick for pick in reagent_pass["picks"] if pick[0] == slot])) for reagent_pass in plan["passes"] if any(pick[0] == slot for pick in reagent_pass["picks"])) for slot in plan["racks"])
+    text += " (" + str(plan["tips"]) + " tips)"
+    if plan["refresh"]:
+        text += ", a full rack goes into " + plan["refresh"] + " at the bead pause"
+    if plan["clashes"]:
+        text += ", CLASHES: " + "; ".join(reagent + " at " + slot + " over " + neighbour for reagent, slot, neighbour in plan["clashes"])
+    return text
+#endregion
+
+#region batch scheduling - interleave plates during incubations
+##################################################################################
+##################################################################################
+PLATE_NAMES = "ABCD"
+
+#robot + bench time per step in minutes, fixed approximations: legendplex_timing.py estimate of a full plate (incubation
+#as pauses) plus ~2 min per vacuum, not recomputed for the run's settings, so the operator messages call them approximate
+STEP_MINUTES = {1: 22, 2: 17, 3: 8, 4: 10}
+
+#incubation after each step (shaking at 1200), the plate is off the deck
+INCUBATION_MINUTES = {1: 120, 2: 60, 3: 30, 4: 0}
+INCUBATION_RPM = 1200
+
+#the Heater-Shaker incubation needs the 384 plate's z offset on the universal flat adapter, measured on the robot and put
+#into Agilent_384_Well_Plate.json (stackingOffsetWithLabware); it is not measured yet, and a guessed offset could drive the
+#tips (1.2mm above the well bottom) into the plate, so the choice is not offered
+HEATER_SHAKER_OFFSET_MEASURED = False
+
+#timed incubations log the time left every this many minutes
+COUNTDOWN_MINUTES = 10
+
+#greedy list schedule: always run the step that can start earliest (first plate wins ties)
+#returns [{plate, step, start, end, idle}] in run order, times in minutes from the start
+def schedule_batch(plate_count, step_minutes=STEP_MINUTES, incubation_minutes=INCUBATION_MINUTES):
+    next_step = [1] * plate_count
+    ready = [0] * plate_count
+    clock = 0
+    schedule = []
+    while any(step <= 4 for step in next_step):
+        plate = min((p for p in range(plate_count) if next_step[p] <= 4), key=lambda p: (max(ready[p], clock), p))
+        step = next_step[plate]
+        start = max(ready[plate], clock)
+        end = start + step_minutes[step]
+        schedule.append({"plate": plate, "step": step, "start": start, "end": end, "idle": start - clock})
+        clock = end
+        ready[plate] = end + incubation_minutes[step]
+        next_step[plate] += 1
+    return schedule
+
+#one line per scheduled step, for the run log
+def schedule_summary(schedule):
+    lines = ["Batch of " + str(len({entry["plate"] for entry in schedule})) + " plates, planned finish about +" + str(round(schedule[-1]["end"])) + " min (fixed approximate step times " + "/".join(str(STEP_MINUTES[step]) for step in sorted(STEP_MINUTES)) + " min):"]
+    for entry in schedule:
+        lines.append("plate " + PLATE_NAMES[entry["plate"]] + " step " + str(entry["step"]) + " +" + str(round(entry["start"])) + "-" + str(round(entry["end"])) + " min" + (" (robot idle " + str(round(entry["idle"])) + " min before)" if entry["idle"] else ""))
+    return " | ".join(lines)
+#endregion
+
+#region resume - restart points of a stopped run
+##################################################################################
+##################################################################################
+#parts of each step in run order; a restart point is a part plus the column group (reagents) or wash round to start at
+#full mode adds matrix with the assay buffer pass
+STEP_PARTS = {
+    1: [("prewet", "prewet"), ("matrix", "matrix"), ("buffer", "assay buffer"), ("standards", "standard curve"), ("sample", "sample transfer"), ("beads", "beads")],
+    2: [("wash", "wash"), ("detection", "detection antibody")],
+    3: [("sape", "SA-PE")],
+    4: [("wash", "wash")],
+}
+
+RESUME_CHOICES = [{"display_name": "Start of the run", "value": "start"}] + [
+    {"display_name": "Step " + str(step) + " " + display_name, "value": str(step) + ":" + part}
+    for step, parts in STEP_PARTS.items() for part, display_name in parts
+]
+
+#(step, part index) of a resume_from value, (1, 0) for the start of the run
+def resume_part(value):
+    if value == "start":
+        return 1, 0
+    step, part = value.split(":")
+    return int(step), [name for name, _ in STEP_PARTS[int(step)]].index(part)
+#endregion
+
+#region validation - water runs on the same code path as the assay
+##################################################################################
+##################################################################################
+#operator pauses other than the vacuum pauses become timed waits of this many seconds
+VALIDATION_PAUSE_SECONDS = 5
+
+#incubations run this many seconds per assay minute (120 min bead incubation: 2 min)
+VALIDATION_SECONDS_PER_MINUTE = 1
+
+#numbers (1-based) of keep column groups out of count, spread evenly with the first and last included
+def representative_groups(count, keep):
+    if keep >= count:
+        return list(range(1, count + 1))
+    if keep == 1:
+        return [1]
+    return sorted({1 + round(n * (count - 1) / (keep - 1)) for n in range(keep)})
+
+#one line description of a validation run, for the run log
+def validation_summary(groups):
+    return "Validation run: pauses are " + str(VALIDATION_PAUSE_SECONDS) + " s waits except the vacuum pauses, incubations run " + str(VALIDATION_SECONDS_PER_MINUTE) + " s per minute, full head tips are returned to their racks, " + ("every column group" if groups >= 12 else str(groups) + " column group(s) per reagent pass") + "."
+#endregion
+
+#region run log - structured events instead of per well comments
+##################################################################################
+##################################################################################
+#on the robot the log goes to user storage, when simulating only if LEGENDPLEX_RUN_LOG names a file
+RUN_LOG_DIR = "/data/user_storage/legendplex_runs"
+RUN_LOG_ENV = "LEGENDPLEX_RUN_LOG"
+
+def run_log_path(simulating):
+    if os.environ.get(RUN_LOG_ENV):
+        return os.environ[RUN_LOG_ENV]
+    if simulating:
+        return None
+    return os.path.join(RUN_LOG_DIR, time.strftime("%Y%m%d_%H%M%S") + ".jsonl")
+
+#last completed part of a step, rewritten next to the run log after every column group and wash round
+CHECKPOINT_FILE = "checkpoint.json"
+
+#one JSON object per logical operation (transfer, wash, pause, incubation, step) with start/end seconds
+#from the start of the run, appended to the file as each operation ends so a stopped run keeps its log
+class RunLog:
+    def __init__(self, path=None, clock=time.monotonic):
+        self.path = path
+        self.clock = clock
+        self.started = clock()
+        self.events = []
+        self.plate = None
+        self.step = None
+        self.last_checkpoint = None
+        if path:
+            try:
+                os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+                open(path, "w").close()
+            except OSError:
+                self.path = None
+    
+    def now(self):
+        return round(self.clock() - self.started, 3)
+    
+    #the event is written even when the operation raises, with the error that stopped it
+    @contextmanager
+    def record(self, op, **fields):
+        event = {"op": op, "plate": self.plate, "step": self.step, "start": self.now()}
+        event.update(fields)
+        self.events.append(event)
+        try:
+            yield event
+        except Exception as error:
+            event["error"] = type(error).__name__ + ": " + str(error)
+            raise
+        finally:
+            event["end"] = self.now()
+            if self.path:
+                with open(self.path, "a") as log_file:
+                    log_file.write(json.dumps(event) + "\n")
+    
+    #a column group or wash round is done: keep it, with the resume parameters that continue after it
+    def checkpoint(self, part, index):
+        self.last_checkpoint = {
+            "plate": self.plate, "step": self.step, "part": part, "index": index, "time": self.now(),
+            "resume": {"resume_from": str(self.step) + ":" + part, "resume_index": index + 1, "resume_plate": PLATE_NAMES.index(self.plate or "A") + 1},
+        }
+        if self.path:
+            try:
+                with open(os.path.join(os.path.dirname(self.path), CHECKPOINT_FILE), "w") as checkpoint_file:
+                    json.dump(self.last_checkpoint, checkpoint_file)
+            except OSError:
+                pass
     
+    #one line per step for the run log comment: transfers per reagent, touch-tips, washes, pauses, time
+    def step_summary(self, plate, step):
+        events = [event for event in self.events if event["plate"] == plate and event["step"] == step]
+        transfers = {}
+        for event in events:
+            if event["op"] == "transfer":
+                transfers[event["reagent"]] = transfers.get(event["reagent"], 0) + 1
+        text = "Step " + str(step) + " summary: "
+        text += (", ".join(str(count) + " " + reagent for reagent, count in transfers.items()) or "no") + " transfer(s), "
+        text += str(sum(event.get("touches", 0) for event in events)) + " touch-tips, "
+        text += str(sum(event["op"] == "wash" for event in events)) + " wash(es), "
+        text += str(sum(event["op"] == "pause" for event in events)) + " pause(s)"
+        timed = [event for event in events if event["op"] == "step" and "end" in event]
+        if timed:
+            text += ", " + str(round((timed[-1]["end"] - timed[-1]["start"]) / 60, 1)) + " min"
+        return text
+#endregion
 
+#all in one protocol starts here
+def run(protocol: protocol_api.ProtocolContext):
+    
+    #column or full (96 channel) reagent additions
+    reagent_mode = protocol.params.reagent_mode
+    plate_count = protocol.params.plate_count
+    
+    #timed / heater-shaker incubations, batches hand plates over to the bench shaker at the pauses
+    incubation = protocol.params.incubation if plate_count == 1 else "pause"
+    
+    #validation (water) run: the same commands, only pauses, incubation times, tip disposal and column groups change
+    validation = protocol.params.run_mode == "validation"
+    
+    #standard curve built on deck with assay buffer from the reagent plate slot, so column mode and one plate only
+    standards_on_deck = protocol.params.standard_prep == "deck"
+    if standards_on_deck and (reagent_mode == "full" or plate_count > 1):
+        raise ValueError("The on deck standard curve needs the column reagent mode and a single plate (its assay buffer takes the reagent plate slot " + DECK_LAYOUT["reagent_plate"] + ")")
+    
+    #slots from the deck layout
+    deck = DECK_LAYOUT
+    
+    #loading of 96 well & 384 well plate    
+    source_plate = protocol.load_labware('corning_96_wellplate_360ul_flat', deck["source"], label='Source Plate')
+    if incubation == "heater_shaker":
+        #heater-shaker in the 384 plate slot, the plate stays on it for the whole run and shakes in place
+        heater_shaker = protocol.load_module("heaterShakerModuleV1", deck["dest"])
+        shaker_adapter = heater_shaker.load_adapter("opentrons_universal_flat_adapter")
+        dest_plate = shaker_adapter.load_labware('agilent_384_wellplate_140ul', label='Destination Plate')
+        #the pipette only moves over a latched heater-shaker
+        heater_shaker.close_labware_latch()
+    else:
+        dest_plate = protocol.load_labware('agilent_384_wellplate_140ul', deck["dest"], label='Destination Plate')
+    
+    #loading of x12 and x1 reservoirs
+    small_reservoir = protocol.load_labware('nest_12_reservoir_15ml', deck["reservoir"], label='Small Reservoir')
+    wash_reservoir = protocol.load_labware('nest_1_reservoir_195ml', deck["wash"], label='Wash Buffer Reservoir')
+    
+    #load trash bin
+    trash = protocol.load_trash_bin(location=deck["trash"])
+
+    #reagent tips: no adapter for partials (column mode), full mode picks whole racks so needs the adapter
+    reagent_tip_adapter = "opentrons_flex_96_tiprack_adapter" if reagent_mode == "full" else None
+    
+    #sample map > 96>384 quadrant layout, worked out once for the whole run
+    layout = PlateLayout(
+        read_sample_map(protocol.params.sample_map),
+        [[well.well_name for well in column] for column in dest_plate.columns()],
+    )
+    
+    #reagent tip racks from the tip plan: only the racks the sample map needs, reagents share racks,
+    #every pickup has its rack column and nozzle start worked out before the run
+    tip_plan = plan_tips(layout, reagent_mode, deck, separate_steps=plate_count > 1, standards=standards_on_deck)
+    reagent_racks = {slot: protocol.load_labware("opentrons_flex_96_filtertiprack_50ul", slot, adapter=reagent_tip_adapter) for slot in tip_plan["racks"]}
+    tip_passes = {reagent_pass["reagent"]: reagent_pass for reagent_pass in tip_plan["passes"]}
+    if tip_plan["clashes"]:
+        raise ValueError(tip_plan_summary(tip_plan))
+    protocol.comment(tip_plan_summary(tip_plan))
+    
+    #full mode: 96 well reagent plate, restaged by the operator at the pauses before each reagent
+    if reagent_mode == "full":
+        reagent_plate = protocol.load_labware('corning_96_wellplate_360ul_flat', deck["reagent_plate"], label='Reagent Plate')
+    
+    #on deck standard curve: assay buffer reservoir in the reagent plate slot, the series planned before the run
+    standard_plan = None
+    if standards_on_deck:
+        standard_plan = plan_standards(protocol.params.standard_points, protocol.params.standard_top, protocol.params.standard_factor, [column for column, content in sorted(layout.sample_map.items()) if content == "standard"])
+        standard_buffer = protocol.load_labware(STANDARD_BUFFER_RESERVOIR, deck["reagent_plate"], label='Standard Buffer Reservoir')
+        protocol.comment(standard_plan_summary(standard_plan, deck["reagent_plate"]))
+    
+    
+    #load of tips on racks with adapter with adapter for full plate load
+    tips_5 = protocol.load_labware("opentrons_flex_96_filtertiprack_50ul", deck["sample_tips"], adapter="opentrons_flex_96_tiprack_adapter") 
+    tips_6 = protocol.load_labware(WASH_TIPRACKS[protocol.params.wash_tips], deck["wash_tips"],adapter="opentrons_flex_96_tiprack_adapter") 
+    full_tip_racks = [tips_5]  # Add the other tip racks here
+    full_tip_racks_wash = [tips_6]  # Add the other tip racks here
+    deck_racks = dict(reagent_racks, **{deck["sample_tips"]: tips_5})
 
-    #STANDARDS
-    # Generate the well groups for the step
-    well_groups = generate_384_well_groups()
-    well_groups = well_groups[:1] # Limit to the first 2 groups (A1-B2, A3-B4, ..., A23-B24)
-    # In your protocol:
-    for i, group in enumerate(well_groups):
-        protocol.comment(str(dest_plate[group[0]]))   
-        protocol.comment(str(dest_plate[group[1]]))
-        protocol.comment(str(dest_plate[group[2]]))
-        protocol.comment(str(dest_plate[group[3]]))
-        pipette.pick_up_tip()
-        # Aspirate 28µL (7µL × 4 quadrants) from the source well
-        pipette.aspirate(35, small_reservoir['A1'], rate=0.5)  # Example source well, change as needed
-        protocol.delay(seconds=1) # pause for 5 seconds 
-        # Dispense 7µL to each of the four quadrant wells in the 384-well plate
-        # The corresponding well in each quadrant gets the same source
-        pipette.dispense(7, dest_plate[group[0]].bottom(z=well_height_sample), rate=sample_rate)  # Top-left quadrant
-        pipette.touch_tip(v_offset=touch_v_offset,speed=30.0, radius=touchtip_ratio)  # Touch tip to the side of the well
-        pipette.dispense(7, dest_plate[group[1]].bottom(z=well_height_sample), rate=sample_rate)  # Top-left quadrant
-        pipette.touch_tip(v_offset=touch_v_offset,speed=30.0, radius=touchtip_ratio)
-        pipette.dispense(7, dest_plate[group[2]].bottom(z=well_height_sample), rate=sample_rate)  # Top-left quadrant
-        pipette.touch_tip(v_offset=touch_v_offset,speed=30.0, radius=touchtip_ratio)
-        pipette.dispense(7, dest_plate[group[3]].bottom(z=well_height_sample), rate=sample_rate)  # Top-left quadrant
-        pipette.touch_tip(v_offset=touch_v_offset,speed=30.0, radius=touchtip_ratio)
-        pipette.drop_tip(trash)  # Discard the tip after dispensing
+    #load pipette, note tips not attached
+    pipette = protocol.load_instrument('flex_96channel_1000','left')
+    
+    #touch tip strategy chosen for each reagent
+    touch_strategy = {reagent: TOUCH_STRATEGIES[getattr(protocol.params, "touch_" + reagent)] for reagent, _ in TOUCH_REAGENTS}
+    
+    #liquid class of each reagent for its source labware (sample plate, reagent plate or NEST), and of the washes
+    reagent_source = {reagent: (source_plate if reagent == "sample" else reagent_plate if reagent_mode == "full" else small_reservoir) for reagent, _ in TOUCH_REAGENTS}
+    liquid = {reagent: liquid_class(getattr(protocol.params, "class_" + reagent), reagent_source[reagent].load_name, dest_plate.load_name) for reagent, _ in TOUCH_REAGENTS}
+    wash_liquid = liquid_class("wash", wash_reservoir.load_name, dest_plate.load_name)
+    #on deck standards are handled like the samples
+    if standards_on_deck:
+        touch_strategy["standards"] = touch_strategy["sample"]
+        liquid["standards"] = liquid_class(protocol.params.class_sample, source_plate.load_name, source_plate.load_name)
+        standard_buffer_liquid = liquid_class(protocol.params.class_buffer, STANDARD_BUFFER_RESERVOIR, source_plate.load_name)
+    protocol.comment(liquid_class_summary(liquid))
+    
+    #structured run log (JSONL), one summary comment per step instead of a comment per well
+    run_log = RunLog(run_log_path(protocol.is_simulating()))
+    if validation:
+        protocol.comment(validation_summary(protocol.params.validation_groups))
+    
+    #tips go to the trash, a validation run puts full head tips back where they came from (partial tips cannot be returned)
+    def discard_tip():
+        if validation and pipette.active_channels == 96:
+            pipette.return_tip()
+        else:
+            pipette.drop_tip(trash)
+    
+    #resumed run: schedule entry, part and column group / wash round to restart at (the entry is set once scheduled)
+    #position: schedule entry and step being run
+    resume_step, resume_part_index = resume_part(protocol.params.resume_from)
+    resume = {"entry": 0, "part": resume_part_index, "index": protocol.params.resume_index}
+    position = {"entry": 0, "step": 1}
+    
+    #first column group / wash round of a part of the current step to run, None when the whole part comes before the restart point
+    def first_index(part):
+        here = (position["entry"], [name for name, _ in STEP_PARTS[position["step"]]].index(part))
+        start = (resume["entry"], resume["part"])
+        if here < start:
+            return None
+        return resume["index"] if here == start else 1
+    
+    #dispense into each quadrant well of a group, removing droplets as the reagent's strategy says
+    def dispense_quadrants(reagent, group, volume):
+        
+        strategy = touch_strategy[reagent]
+        profile = liquid[reagent]
+        #air still in the tip from the last air gap, pushed out ahead of the next dispense
+        air = 0
+        touches = 0
+        for n, well in enumerate(group):
+            pipette.dispense(volume + air, layout.location(dest_plate, well, profile["dispense_height"]), rate=profile["dispense_rate"])
+            if strategy["when"] == "every" or (strategy["when"] == "last" and n == len(group) - 1):
+                pipette.touch_tip(v_offset=profile["touch_v_offset"], speed=strategy["speed"], radius=profile["touch_radius"])  # Touch tip to the side of the well
+                touches += 1
+            if strategy["air_gap"]:
+                pipette.air_gap(strategy["air_gap"])
+                air = strategy["air_gap"]
+        return touches
+    
+    #add 7ul of one reagent to every quadrant well of the given 384 groups
+    #column mode: one COLUMN pass per group from the NEST 12 reservoir well
+    #full mode: one 96 channel pass from the reagent plate fills all 4 quadrants of the plate
+    #mix_plan: mix cycles before each column group, a skipped group's mix is done before the next group that runs
+    def add_reagent(reagent, source_well, aspirate_volume, well_groups, mix_plan=None):
         
-    protocol.comment("standard wells have now 7ul of matrix")
-    
-
-#SAMPLES    
-    # Generate the well groups for the step
-    well_groups = generate_384_well_groups()
-    well_groups = well_groups[1:] # remainder of wells 
-    # In your protocol:
-    for i, group in enumerate(well_groups):
-        protocol.comment(str(dest_plate[group[0]]))   
-        protocol.comment(str(dest_plate[group[1]]))
-        protocol.comment(str(dest_plate[group[2]]))
-        protocol.comment(str(dest_plate[group[3]]))
-        pipette.pick_up_tip()
-        # Aspirate 28µL (7µL × 4 quadrants) from the source well
-        pipette.aspirate(50, small_reservoir['A2'], rate=0.5)  # Example source well, change as needed
-        protocol.delay(seconds=1) # pause for 5 seconds
-        # Dispense 7µL to each of the four quadrant wells in the 384-well plate
-        # The corresponding well in each quadrant gets the same source
-        pipette.dispense(7, dest_plate[group[0]].bottom(z=well_height_sample), rate=0.5)  # Top-left quadrant
-        pipette.touch_tip(v_offset=touch_v_offset,speed=30.0, radius=touchtip_ratio)
-        pipette.dispense(7, dest_plate[group[1]].bottom(z=well_height_sample), rate=0.5)  # Top-left quadrant
-        pipette.touch_tip(v_offset=touch_v_offset,speed=30.0, radius=touchtip_ratio)
-        pipette.dispense(7, dest_plate[group[2]].bottom(z=well_height_sample), rate=0.5)  # Top-left quadrant
-        pipette.touch_tip(v_offset=touch_v_offset,speed=30.0, radius=touchtip_ratio)
-        pipette.dispense(7, dest_plate[group[3]].bottom(z=well_height_sample), rate=0.5)  # Top-left quadrant
-        pipette.touch_tip(v_offset=touch_v_offset,speed=30.0, radius=touchtip_ratio)
-        pipette.drop_tip(trash)  # Discard the tip after dispensing
+        #tips and nozzle start from the tip plan, one pick per column group
+        tip_pass = tip_passes[reagent]
+        #resumed run: column groups before the restart point are done, their tips are gone from the racks
+        first = first_index(reagent)
+        if first is None or first > len(tip_pass["picks"]):
+            return
+        #validation run: a representative subset of the column groups
+        groups_run = representative_groups(len(tip_pass["picks"]), protocol.params.validation_groups if validation else 12)
+        tip_racks = [reagent_racks[slot] for slot in sorted({slot for slot, _ in tip_pass["picks"]})]
+        if reagent_mode == "full":
+            pipette.configure_nozzle_layout(
+                style=ALL,
+                start="A1",
+                tip_racks=tip_racks
+                )
+            source = reagent_plate['A1']
+            well_groups = [["A1", "A2", "B1", "B2"]]
+        else:
+            pipette.configure_nozzle_layout(
+                style=COLUMN,
+                start=tip_pass["start"],
+                tip_racks=tip_racks
+                )
+            source = small_reservoir[source_well]
         
-    protocol.comment("samples wells have now 7ul of assay buffer")
+        #last column group run, so mixes of skipped groups (resume, validation) are not lost
+        last_run = 0
+        for n, ((slot, column), group) in enumerate(zip(tip_pass["picks"], well_groups), 1):
+            if n < first or n not in groups_run:
+                continue
+            mix_cycles = max(mix_plan[last_run:n]) if mix_plan else 0
+            last_run = n
+            #wells actioning go to the run log
+            with run_log.record("transfer", reagent=reagent, wells=group, volume=7, tip_rack=slot, tip_column=column, channels=96 if reagent_mode == "full" else 8, touch=getattr(protocol.params, "touch_" + reagent), liquid_class=liquid[reagent]["name"], mix=mix_cycles) as event:
+                pipette.pick_up_tip(reagent_racks[slot]["A" + str(column)])
+                #resuspend before aspirating (beads)
+                if mix_cycles:
+                    pipette.mix(mix_cycles, BEAD_MIX["volume"], source)
+                # Aspirate 28µL (7µL × 4 quadrants) plus overage from the source well
+                pipette.aspirate(aspirate_volume, source.bottom(z=liquid[reagent]["aspirate_height"]), rate=liquid[reagent]["aspirate_rate"])
+                if liquid[reagent]["delay"]:
+                    protocol.delay(seconds=liquid[reagent]["delay"]) 
+                # Dispense 7µL to each of the four quadrant wells in the 384-well plate
+                # The corresponding well in each quadrant gets the same source
+                event["touches"] = dispense_quadrants(reagent, group, 7)
+                discard_tip()  # Discard the tip after dispensing
+            run_log.checkpoint(reagent, n)
     
-    # Protocol steps
-    protocol.comment("Starting 96 to 384 well distribution...")
+    #on deck standard curve, from the plan: down each standard column of the sample plate with single tips (A1 nozzle),
+    #one tip for the assay buffer, a fresh tip for every transfer; the sample transfer then takes it to the 384 plate
+    #resumed run: standard columns before the restart point are done, a stopped column is set up again and rebuilt
+    def build_standards(tag):
+        first = first_index("standards")
+        if first is None or first > len(standard_plan["columns"]):
+            return
+        plan = standard_plan
+        tip_pass = tip_passes["standards"]
+        profile = liquid["standards"]
+        operator_pause(tag + "Standard curve: " + str(plan["top_volume"]) + "ul top standard in row A of source column(s) " + ", ".join(str(column) for column in plan["columns"]) + " (rows B-H empty), " + str(round(plan["buffer_volume"] / 1000, 2)) + " ml assay buffer in A1 of the reservoir in " + deck["reagent_plate"] + ", then click 'Resume' to continue")
+        for n, ((slot, tip_column), column) in enumerate(zip(tip_pass["picks"], plan["columns"]), 1):
+            if n < first:
+                continue
+            pipette.configure_nozzle_layout(
+                style=SINGLE,
+                start="A1",
+                tip_racks=[reagent_racks[slot]]
+                )
+            wells = [source_plate[row + str(column)] for row in STANDARD_ROWS]
+            tips = [reagent_racks[slot][row + str(tip_column)] for row in STANDARD_ROWS]
+            with run_log.record("standards", column=column, points=plan["points"], factor=plan["factor"], top=plan["rows"][0]["concentration"], tip_rack=slot, tip_column=tip_column, channels=1, liquid_class=profile["name"]):
+                #assay buffer into every row below the top standard
+                pipette.pick_up_tip(tips[0])
+                for well in wells[1:]:
+                    for volume in plan["buffer_trips"]:
+                        pipette.aspirate(volume, standard_buffer["A1"].bottom(z=standard_buffer_liquid["aspirate_height"]), rate=standard_buffer_liquid["aspirate_rate"])
+                        pipette.dispense(volume, well.bottom(z=standard_buffer_liquid["dispense_height"]), rate=standard_buffer_liquid["dispense_rate"])
+                discard_tip()
+                #serial dilution down the rows, the top standard is mixed before its first transfer
+                for k, (source, target) in enumerate(zip(wells[:plan["points"] - 1], wells[1:plan["points"]]), 1):
+                    pipette.pick_up_tip(tips[k])
+                    if k == 1:
+                        pipette.mix(plan["mix_cycles"], plan["mix_volume"], source.bottom(z=profile["aspirate_height"]))
+                    for volume in plan["transfer_trips"]:
+                        pipette.aspirate(volume, source.bottom(z=profile["aspirate_height"]), rate=profile["aspirate_rate"])
+                        if profile["delay"]:
+                            protocol.delay(seconds=profile["delay"])
+                        pipette.dispense(volume, target.bottom(z=profile["dispense_height"]), rate=profile["dispense_rate"])
+                    pipette.mix(plan["mix_cycles"], plan["mix_volume"], target.bottom(z=profile["aspirate_height"]))
+                    pipette.blow_out(target.top())
+                    discard_tip()
+            run_log.checkpoint("standards", n)
     
-    #set flex to 96 well
-    pipette.configure_nozzle_layout(
-    style=ALL,
-    start="A1",
-    tip_racks=full_tip_racks
-        )
-     
-    # Pick up a tip
-    pipette.pick_up_tip()
+    #full mode: tell the operator what to put into the reagent plate at a pause
+    def stage_prompt(reagent):
+        if reagent_mode == "full":
+            return " Stage " + reagent + " in the reagent plate (" + deck["reagent_plate"] + ")."
+        return ""
+
+    #wash plans, the same for every plate
+    washes = wash_plans(int(protocol.params.wash_tips))
+    
+    #operator pause, the run log keeps how long the robot waited
+    #hold: a real pause in a validation run too (the plate has to be vacuumed before the next dispense)
+    def operator_pause(message, hold=False):
+        with run_log.record("pause", message=message, validation=validation and not hold):
+            if validation and not hold:
+                protocol.delay(seconds=VALIDATION_PAUSE_SECONDS, msg="Validation, no pause: " + message)
+            else:
+                protocol.pause(message)
+    
+    #pause for the operator to vacuum the plate, the heater-shaker unlatches so the plate can come off
+    def vacuum_pause(message):
+        if incubation == "heater_shaker":
+            heater_shaker.open_labware_latch()
+        operator_pause(message, hold=True)
+        if incubation == "heater_shaker":
+            heater_shaker.close_labware_latch()
+    
+    #run a wash plan with the 200/1000ul wash tips, the tips are returned for the next wash
+    #part: prewet or wash, for checkpoints and resuming; vacuum_message: pause after every vacuumed round
+    #returns False when a resumed run has no round of this wash left
+    def run_wash(plan, tag, part, vacuum_message=None):
+        first = first_index(part)
+        plan = resume_wash(plan, first) if first is not None else None
+        if plan is None:
+            return False
+        with run_log.record("wash", rounds=plan["cycles"], volume=plan["well_volume"], final_volume=plan["final_volume"], trips=len(plan["trips"]), tip_rack=deck["wash_tips"]):
+            protocol.comment(wash_plan_summary(plan))
         
-    #mix source
-    pipette.mix(5, 25, source_plate["A1"])
+            #set flex to 96 well and tips wash
+            pipette.configure_nozzle_layout(
+            style=ALL,
+            start="A1",
+            tip_racks=full_tip_racks_wash
+            )
         
-    # Aspirate 45µL from the source plate (96-well) into the pipette tip
-    pipette.aspirate(45, source_plate['A1'])  # Example source well, change as needed
-    
-    protocol.pause("check for bubbles")
-    protocol.delay(seconds=5) # pause for 5 seconds
-    
-    
-    
-    # Dispense 7µL to each of the four quadrant wells in the 384-well plate
-    # The corresponding well in each quadrant gets the same source
-    #pipette.touch_tip(dest_plate["A1"], radius=0.5, v_offset=-5)  # Touch tip to the side of the well
-    pipette.dispense(7, dest_plate['A1'].bottom(z=well_height_sample), rate=sample_rate)  # Top-left quadrant
-    pipette.touch_tip(v_offset=touch_v_offset,speed=30.0, radius=touchtip_ratio)
-    pipette.dispense(7, dest_plate['A2'].bottom(z=well_height_sample), rate=sample_rate)  # Top-left quadrant
-    pipette.touch_tip(v_offset=touch_v_offset,speed=30.0, radius=touchtip_ratio)
-    pipette.dispense(7, dest_plate['B1'].bottom(z=well_height_sample), rate=sample_rate)  # Top-left quadrant
-    pipette.touch_tip(v_offset=touch_v_offset,speed=30.0, radius=touchtip_ratio)
-    pipette.dispense(7, dest_plate['B2'].bottom(z=well_height_sample), rate=sample_rate)  # Top-left quadrant
-    pipette.touch_tip(v_offset=touch_v_offset,speed=30.0, radius=touchtip_ratio)    
-    # Drop the tip
-    pipette.drop_tip(trash)
-    #pipette.return_tip()  # Discard the tip after dispensing
-    
-    protocol.comment("Distribution complete!, now adding beads")
-    protocol.pause("Remove tip rack from A2 and add vortexed beads to the NEST, to continue otherwise there will be a clash")
-    
-      
-    #set flex to column mode
-    pipette.configure_nozzle_layout(
-        style=COLUMN,
-        start="A1",
-        tip_racks=partial_tip_racks_secondary
-    )
+            #pick up full tips for washing, they are returned to the rack and reused
+            pipette.pick_up_tip(tips_6["A1"])
+            trips = plan["trips"]
+            if plan["rinse"]:
+                pipette.aspirate(plan["rinse"], wash_reservoir['A1'].bottom(z=wash_liquid["aspirate_height"]), rate=wash_liquid["aspirate_rate"])  
+                protocol.comment("cleaning, waiting 30 seconds")
+                #blow out the remaining liquid in the tip
+                pipette.blow_out(trash)
+            pipette.aspirate(trips[0]["aspirate"], wash_reservoir['A1'].bottom(z=wash_liquid["aspirate_height"]), rate=wash_liquid["aspirate_rate"])  
+        
+            for n, trip in enumerate(trips):
+                #pre-dispense
+                pipette.dispense(plan["predispense"], wash_reservoir['A1'])  
+                for k, (cycle, quadrant, volume) in enumerate(trip["dispenses"]):
+                    pipette.dispense(volume, dest_plate[WASH_QUADRANTS[quadrant]].bottom(z=wash_liquid["dispense_height"]), rate=wash_liquid["dispense_rate"])
+                    if quadrant < len(WASH_QUADRANTS) - 1:
+                        continue
+                    #round done: reload for the next trip before the vacuum, so the pause covers nothing else
+                    last = k == len(trip["dispenses"]) - 1
+                    if last and n + 1 < len(trips):
+                        pipette.aspirate(trips[n + 1]["aspirate"], wash_reservoir['A1'].bottom(z=wash_liquid["aspirate_height"]), rate=wash_liquid["aspirate_rate"])  
+                    run_log.checkpoint(part, cycle)
+                    if cycle > plan["cycles"]:
+                        protocol.comment(tag + "Final " + str(volume) + "ul dispense, do not vacuum, ready for run.")
+                    elif vacuum_message:
+                        #a trip that goes on after the vacuum (1000ul tips) waits over the reservoir, not over the plate
+                        if not last:
+                            pipette.move_to(wash_reservoir['A1'].top())
+                        vacuum_pause(tag + "Dispense " + str(cycle) + "/" + str(plan["cycles"]) + " complete. " + vacuum_message)
+        
+            #empty wash buffer 
+            pipette.blow_out(trash)
+            #return wash tips
+            pipette.return_tip()    
+        return True
+    
+    #timed incubation with a countdown in the run log, shaking on the heater-shaker when there is one
+    def incubate(minutes, tag):
+        with run_log.record("incubation", minutes=minutes, mode=incubation, rpm=INCUBATION_RPM if incubation == "heater_shaker" else 0):
+            if incubation == "heater_shaker":
+                heater_shaker.set_and_wait_for_shake_speed(INCUBATION_RPM)
+            left = minutes
+            while left > 0:
+                chunk = min(COUNTDOWN_MINUTES, left)
+                protocol.delay(seconds=chunk * (VALIDATION_SECONDS_PER_MINUTE if validation else 60), msg=tag + "Incubating, " + str(left) + " of " + str(minutes) + " min left" + (" (shaking at " + str(INCUBATION_RPM) + " rpm)" if incubation == "heater_shaker" else ""))
+                left -= chunk
+            if incubation == "heater_shaker":
+                heater_shaker.deactivate_shaker()
+    
+    #batch mode: messages name the plate they are about ("Plate B: ...")
+    def plate_tag(plate):
+        if plate_count > 1:
+            return "Plate " + PLATE_NAMES[plate] + ": "
+        return ""
+
+#region step 1 - prewet, buffer, sample 96>384 aliquot, bead mix/aliquot
+##################################################################################
+##################################################################################
+    def step_1(plate):
+        tag = plate_tag(plate)
+        protocol.comment("STEP 1 commencing. " + tag + "This step prewets the plate with wash tips, awaits filtrations, and then aluiquots required reagents into the appropriate well. It is setup for 96>384 well processing but can be modified as required).")
+        protocol.comment(layout.summary())
+        
+        #prewet, one 4x40ul round after rinsing the wash tips, then wait for user to vaccum
+        if run_wash(washes["prewet"], tag, "prewet"):
+            vacuum_pause(tag + "Place is wetted. Wait 1+ minute, then vacuum and return for addition of next compnents of the assay. Then click 'Resume' to continue." + stage_prompt("matrix in column 1 and assay buffer in columns 2-12"))
     
-    # Generate the well groups for the step
-    well_groups = generate_384_well_groups()
-    well_groups = well_groups[:] # all ([:1]) or first 2 groups ((0,1))
-    
-    # In your protocol:
-    for i, group in enumerate(well_groups):
-        protocol.comment(str(dest_plate[group[0]]))   
-        protocol.comment(str(dest_plate[group[1]]))
-        protocol.comment(str(dest_plate[group[2]]))
-        protocol.comment(str(dest_plate[group[3]]))
-        pipette.pick_up_tip()
-        pipette.mix(10, 30, small_reservoir["A3"])
-        # Aspirate 28µL (7µL × 4 quadrants) from the source well
-        pipette.aspirate(30, small_reservoir['A3'], rate=0.5)
-        protocol.delay(seconds=1) 
-        # Dispense 7µL to each of the four quadrant wells in the 384-well plate
-        # The corresponding well in each quadrant gets the same source
-        #pipette.touch_tip(dest_plate[group[0]], radius=0.5, v_offset=-5)  # Touch tip to the side of the well
-        pipette.dispense(7, dest_plate[group[0]].bottom(z=well_height_sample), rate=sample_rate)  # Top-left quadrant
-        pipette.touch_tip(v_offset=touch_v_offset,speed=30.0, radius=touchtip_ratio)
-        pipette.dispense(7, dest_plate[group[1]].bottom(z=well_height_sample), rate=sample_rate)  # Top-left quadrant
-        pipette.touch_tip(v_offset=touch_v_offset,speed=30.0, radius=touchtip_ratio)
-        pipette.dispense(7, dest_plate[group[2]].bottom(z=well_height_sample), rate=sample_rate)  # Top-left quadrant
-        pipette.touch_tip(v_offset=touch_v_offset,speed=30.0, radius=touchtip_ratio)
-        pipette.dispense(7, dest_plate[group[3]].bottom(z=well_height_sample), rate=sample_rate)  # Top-left quadrant
-        pipette.touch_tip(v_offset=touch_v_offset,speed=30.0, radius=touchtip_ratio)
+        if reagent_mode == "full":
+            #MATRIX + ASSAY BUFFER in one pass: reagent plate column 1 holds matrix, columns 2-12 assay buffer
+            #the pass follows the assay buffer droplet removal setting
+            add_reagent("buffer", None, ASPIRATE_VOLUMES["matrix"], None)
+            protocol.comment("standard wells have now 7ul of matrix, samples wells have now 7ul of assay buffer")
+        else:
+            #STANDARDS - groups of the standard columns in the sample map
+            well_groups = layout.groups_for("standard")
+            if well_groups:
+                add_reagent("matrix", 'A1', ASPIRATE_VOLUMES["matrix"], well_groups)
+                protocol.comment("standard wells have now 7ul of matrix")
+            
+            #SAMPLES - sample and blank columns get assay buffer
+            well_groups = layout.groups_for("sample", "blank")
+            if well_groups:
+                add_reagent("buffer", 'A2', ASPIRATE_VOLUMES["buffer"], well_groups)
+                protocol.comment("samples wells have now 7ul of assay buffer")
+            
+            #STANDARD CURVE - on deck serial dilution down the standard column(s) of the sample plate, the sample transfer takes it on
+            if standard_plan:
+                build_standards(tag)
+                protocol.comment("standard column(s) of the sample plate now hold the standard curve")
+        
+        #one 96 channel transfer of the whole source plate (a resumed run that starts later skips it)
+        if first_index("sample") == 1:
+            # Protocol steps
+            protocol.comment("Starting 96 to 384 well distribution...")
         
-        pipette.drop_tip(trash)  # Discard the tip after dispensing
+            #set flex to 96 well
+            pipette.configure_nozzle_layout(
+            style=ALL,
+            start="A1",
+            tip_racks=full_tip_racks
+                )
+         
+            with run_log.record("transfer", reagent="sample", wells=["A1", "A2", "B1", "B2"], volume=7, tip_rack=deck["sample_tips"], channels=96, touch=protocol.params.touch_sample, liquid_class=liquid["sample"]["name"]) as event:
+                # Pick up a tip
+                pipette.pick_up_tip(tips_5["A1"])
+                
+                #mix source
+                pipette.mix(5, 25, source_plate["A1"])
+                
+                # Aspirate 45µL (ASPIRATE_VOLUMES) from the source plate (96-well) into the pipette tip
+                pipette.aspirate(ASPIRATE_VOLUMES["sample"], source_plate['A1'].bottom(z=liquid["sample"]["aspirate_height"]), rate=liquid["sample"]["aspirate_rate"])  # Example source well, change as needed
+            
+                operator_pause(tag + "check for bubbles")
+                if liquid["sample"]["delay"]:
+                    protocol.delay(seconds=liquid["sample"]["delay"]) # let the sample settle
+            
+                # Dispense 7µL to each of the four quadrant wells in the 384-well plate
+                # The corresponding well in each quadrant gets the same source
+                #pipette.touch_tip(dest_plate["A1"], radius=0.5, v_offset=-5)  # Touch tip to the side of the well
+                event["touches"] = dispense_quadrants("sample", ["A1", "A2", "B1", "B2"], 7)
+                # Drop the tip
+                discard_tip()
+                #pipette.return_tip()  # Discard the tip after dispensing
+            run_log.checkpoint("sample", 1)
         
-    protocol.pause("all wells should have beads, you have 2 hours to rest, shaking at 1200")
+            protocol.comment("Distribution complete!, now adding beads")
+            if reagent_mode == "full":
+                operator_pause(tag + "Add vortexed beads to every well of the reagent plate (" + deck["reagent_plate"] + "), then click 'Resume' to continue")
+            elif tip_plan["refresh"]:
+                #the standard curve took single tips from this rack, the bead pass needs it full
+                operator_pause(tag + "Add vortexed beads to the NEST (A3) and put a full 50ul tip rack in " + tip_plan["refresh"] + ", then click 'Resume' to continue")
+                reagent_racks[tip_plan["refresh"]].reset()
+            else:
+                operator_pause(tag + "Add vortexed beads to the NEST (A3), then click 'Resume' to continue")
+        
+        # Only the occupied column groups of the sample map
+        well_groups = layout.occupied_groups()
+        
+        #beads are mixed as the bead mixing setting says (10x before every aspirate by default)
+        bead_plan = plan_bead_mixing(len(tip_passes["beads"]["picks"]), protocol.params.bead_mixing, protocol.params.bead_remix_seconds, protocol.params.bead_remix_columns,
+                                     bead_group_seconds(touch_strategy["beads"], liquid["beads"]))
+        protocol.comment(bead_mixing_summary(bead_plan))
+        add_reagent("beads", 'A3', ASPIRATE_VOLUMES["beads"], well_groups, mix_plan=bead_plan)
 #endregion 
 
 #region step 2 - washx3 in a loop, add detection antibody
 ##################################################################################
 ##################################################################################
-    protocol.comment("STEP 2 commencing. Washing the plate 4x via vacuum, and then dispensing detection antibody")
-       
-    #set flex to 96 well and tips wash
-    pipette.configure_nozzle_layout(
-    style=ALL,
-    start="A1",
-    tip_racks=full_tip_racks_wash
-    )
-    
-    # Refresh the tip racks to ensure they are empty
-    pipette.reset_tipracks()
+    def step_2(plate):
+        tag = plate_tag(plate)
+        protocol.comment("STEP 2 commencing. " + tag + "Washing the plate 4x via vacuum, and then dispensing detection antibody")
+           
+        #Wash and wait 4 times.
+        run_wash(washes["step 2"], tag, "wash", "Please vacuum step and place back the filter plate.")
     
-    #pick up full tips for wasing - 200ul
-    pipette.pick_up_tip()
-    
-    #Aspirate 200ul from the source plate (96-well) into the pipette tip
-    pipette.aspirate(180, wash_reservoir['A1'])  
-        
-    #Wash and wait 4 times. 
-    for i in range(1, 5):   
-        #pre-dispense 10
-        pipette.dispense(10, wash_reservoir['A1'])  
-        #dispense sequentially to all 4 quadrants    
-        pipette.dispense(40, dest_plate['A1'].bottom(z=well_height_wash), rate=wash_rate)  # Top-left quadrant
-        pipette.dispense(40, dest_plate['A2'].bottom(z=well_height_wash), rate=wash_rate)  # Top-left quadrant
-        pipette.dispense(40, dest_plate['B1'].bottom(z=well_height_wash), rate=wash_rate)  # Top-left quadrant
-        pipette.dispense(40, dest_plate['B2'].bottom(z=well_height_wash), rate=wash_rate)  # Top-left quadrant
-        #Aspirate 200ul from the source plate (96-well) into the pipette tip
-        if i!=4:
-            pipette.aspirate(170, wash_reservoir['A1'])  
-        #await vacuum
-        protocol.pause("Dispense " + str(i) + "/4 complete. Please vacuum step and place back the filter plate.")
-    
-    #empty wash buffer 
-    pipette.blow_out(trash)
-    #return wash tips
-    pipette.return_tip()    
-
-    #dispense detection antibodies:
-    protocol.comment("Now dispensing detection antibody from A4 of NEST to 384 well plate")
+        #dispense detection antibodies:
+        protocol.comment("Now dispensing detection antibody from A4 of NEST to 384 well plate")
+            
+        # Only the occupied column groups of the sample map
+        well_groups = layout.occupied_groups()
         
-    # Generate the well groups for the step
-    well_groups = generate_384_well_groups()
-    well_groups = well_groups[:] # all wells or [:2]
-    
-    #set pipette mode to partial
-    pipette.configure_nozzle_layout(
-        style=COLUMN,
-        start="A12",
-        tip_racks=partial_tip_racks_tertiary
-        )
-    
-    # Refresh the tip racks refreshed
-    #pipette.reset_tipracks()
-    
-    #Dispense for loop using 50ul tip.
-    for i, group in enumerate(well_groups):
-        #comment wells actioning
-        protocol.comment(str(dest_plate[group[0]]))   
-        protocol.comment(str(dest_plate[group[1]]))
-        protocol.comment(str(dest_plate[group[2]]))
-        protocol.comment(str(dest_plate[group[3]]))
-        #pick up new tips for detection antibody
-        pipette.pick_up_tip()
-        # Aspirate 28µL (7µL × 4 quadrants) from the source well. Example source well, change as needed
-        pipette.aspirate(30, small_reservoir['A4'], rate=0.5)  
-        #delay 
-        protocol.delay(seconds=1) # pause for 5 seconds
-        # Dispense 7µL to each of the four quadrant wells in the 384-well plate
-        # The corresponding well in each quadrant gets the same source
-        pipette.dispense(7, dest_plate[group[0]].bottom(z=well_height_sample), rate=sample_rate)  # Top-left quadrant
-        pipette.touch_tip(v_offset=touch_v_offset,speed=30.0, radius=touchtip_ratio)
-        pipette.dispense(7, dest_plate[group[1]].bottom(z=well_height_sample), rate=sample_rate)  # Top-Right quadrant
-        pipette.touch_tip(v_offset=touch_v_offset,speed=30.0, radius=touchtip_ratio)
-        pipette.dispense(7, dest_plate[group[2]].bottom(z=well_height_sample), rate=sample_rate)  # Bot-Left quadrant
-        pipette.touch_tip(v_offset=touch_v_offset,speed=30.0, radius=touchtip_ratio)
-        pipette.dispense(7, dest_plate[group[3]].bottom(z=well_height_sample), rate=sample_rate)  # Bot-Right quadrant
-        pipette.touch_tip(v_offset=touch_v_offset,speed=30.0, radius=touchtip_ratio)
-        #discard tips
-        pipette.drop_tip(trash)  # Discard the tip after dispensing
-    #step is now complete
-    protocol.pause("Step 2 complete! All wells now have 7µL of detection antibody. You have 60  minutes to rest. When ready for the next step continue.")
+        #Dispense using 50ul tips
+        add_reagent("detection", 'A4', ASPIRATE_VOLUMES["detection"], well_groups)
 #endregion 
 
 #region step 3 - Add strep-avidin_pe
 ##################################################################################
 ##################################################################################
-    protocol.comment("STEP 3 commencing. To add StREPAVIDIN PE.")
-    
-    # Generate the well groups for the step
-    well_groups = generate_384_well_groups()
-    well_groups = well_groups[:] # all wells or [:2]
-    
-    #set pipette mode to partial
-    pipette.configure_nozzle_layout(
-        style=COLUMN,
-        start="A12",
-        tip_racks=partial_tip_racks_quaternary
-        )
-    
-    # Refresh the tip racks to ensure they are empty
-    #pipette.reset_tipracks()
-    
-    
-    #In your protocol:
-    for i, group in enumerate(well_groups):
-        protocol.comment(str(dest_plate[group[0]]))   
-        protocol.comment(str(dest_plate[group[1]]))
-        protocol.comment(str(dest_plate[group[2]]))
-        protocol.comment(str(dest_plate[group[3]]))
-        #pick up new tips for detection antibody
-        pipette.pick_up_tip()
-        # Aspirate 28µL (7µL × 4 quadrants) from the source well
-        pipette.aspirate(30, small_reservoir['A5'], rate=0.5)  # Example source well, change as needed
-        protocol.delay(seconds=1) # pause for 5 seconds
-        # Dispense 7µL to each of the four quadrant wells in the 384-well plate
-        # The corresponding well in each quadrant gets the same source
-        #pipette.touch_tip(dest_plate[group[0]], radius=0.5, v_offset=-5)  # Touch tip to the side of the well
-        pipette.dispense(7, dest_plate[group[0]].bottom(z=well_height_sample), rate=sample_rate)  # Top-left quadrant
-        pipette.touch_tip(v_offset=touch_v_offset,speed=30.0, radius=touchtip_ratio)
-        pipette.dispense(7, dest_plate[group[1]].bottom(z=well_height_sample), rate=sample_rate)  # Top-Right quadrant
-        pipette.touch_tip(v_offset=touch_v_offset,speed=30.0, radius=touchtip_ratio)
-        pipette.dispense(7, dest_plate[group[2]].bottom(z=well_height_sample), rate=sample_rate)  # Bot-Left quadrant
-        pipette.touch_tip(v_offset=touch_v_offset,speed=30.0, radius=touchtip_ratio)
-        pipette.dispense(7, dest_plate[group[3]].bottom(z=well_height_sample), rate=sample_rate)  # Bot-Right quadrant
-        pipette.touch_tip(v_offset=touch_v_offset,speed=30.0, radius=touchtip_ratio)
-        #discard tips
-        pipette.drop_tip(trash)  # Discard the tip after dispensing
-    #step 3 complete    
-    protocol.pause("All wells now have 7µL of strepav_pe. Step 3 complete! Click continue when ready post vacuum to wash")
+    def step_3(plate):
+        tag = plate_tag(plate)
+        protocol.comment("STEP 3 commencing. " + tag + "To add StREPAVIDIN PE.")
+        
+        # Only the occupied column groups of the sample map
+        well_groups = layout.occupied_groups()
+        
+        #Dispense using 50ul tips
+        add_reagent("sape", 'A5', ASPIRATE_VOLUMES["sape"], well_groups)
 #endregion
 
 #region step 4 - wash and resuspend
 ##################################################################################
 ##################################################################################
-    protocol.comment("STEP 4 commencingwash commencing. I.e. wash/refill ready for assay.")
+    def step_4(plate):
+        tag = plate_tag(plate)
+        protocol.comment("STEP 4 commencingwash commencing. " + tag + "I.e. wash/refill ready for assay.")
+        
+        #Wash and wait 4 times, then the final resuspension dispense (no vacuum)
+        run_wash(washes["step 4"], tag, "wash", "Please vacuum and place back the filter plate.")
+#endregion
+
+#region batch - run the steps for every plate in scheduled order
+##################################################################################
+##################################################################################
+    steps = {1: step_1, 2: step_2, 3: step_3, 4: step_4}
     
-    #set flex to 96 well and tips wash
-    pipette.configure_nozzle_layout(
-    style=ALL,
-    start="A1",
-    tip_racks=full_tip_racks_wash
-    )
-     
-    # Refresh the tip racks to ensure they are empty
-    pipette.reset_tipracks()
+    #what the plate has to do after each step (one plate runs use these as they are)
+    step_done = {
+        1: "all wells should have beads, you have 2 hours to rest, shaking at 1200.",
+        2: "Step 2 complete! All wells now have 7µL of detection antibody. You have 60  minutes to rest. When ready for the next step continue.",
+        3: "All wells now have 7µL of strepav_pe. Step 3 complete! Click continue when ready post vacuum to wash",
+        4: "Assay complete, ready for the reader.",
+    }
+    #timed incubations: only the vacuum before the step 4 wash needs the operator
+    step_timed_done = {
+        1: "Bead incubation complete.",
+        2: "Detection antibody incubation complete.",
+        3: "SA-PE incubation complete. Vacuum the plate and place it back on " + deck["dest"] + ", then resume to wash.",
+    }
+    
+    #reagent staged in the reagent plate (full mode) before a step
+    step_reagent = {2: "detection antibody", 3: "streptavidin-PE"}
+    
+    #(rack slot, column) of every tip column each step takes, from the tip plan (the sample rack goes whole)
+    step_tips = {step: [] for step in steps}
+    for reagent_pass in tip_plan["passes"]:
+        for slot, column in reagent_pass["picks"]:
+            step_tips[reagent_pass["step"]] += [(slot, column)] if reagent_mode == "column" else [(slot, c) for c in range(1, 13)]
+    step_tips[1] += [(deck["sample_tips"], column) for column in range(1, 13)]
     
-    #pick up full tips for wasing - 200ul
-    pipette.pick_up_tip()
+    #tip columns taken since each rack was placed; a later plate gets a fresh rack when its step needs one of them
+    used_tips = set()
     
-    #Aspirate 200ul from the wash plate (96-well) into the pipette tip
-    pipette.aspirate(180, wash_reservoir['A1'])  
+    def prepare_racks(step):
+        fresh = sorted({slot for slot, column in step_tips[step] if (slot, column) in used_tips})
+        for slot in fresh:
+            deck_racks[slot].reset()
+            used_tips.difference_update([tip for tip in used_tips if tip[0] == slot])
+        used_tips.update(step_tips[step])
+        return fresh
+    
+    schedule = schedule_batch(plate_count)
+    if plate_count > 1:
+        protocol.comment(schedule_summary(schedule))
+    
+    #batch mode: plate / rack swaps before the following step, added to the end of step pause
+    def handover(entry, previous, fresh):
+        changes = []
+        if entry["plate"] != previous:
+            changes.append("place plate " + PLATE_NAMES[entry["plate"]] + " on " + deck["dest"] + (" and its source plate on " + deck["source"] if entry["step"] == 1 else ""))
+        if fresh:
+            changes.append("put fresh tip racks in " + ", ".join(fresh))
+        text = " Next: plate " + PLATE_NAMES[entry["plate"]] + " step " + str(entry["step"]) + " (planned at about +" + str(round(entry["start"])) + " min, from fixed approximate step times)."
+        if changes:
+            text += " " + "; ".join(changes)[0].upper() + "; ".join(changes)[1:] + "."
+        return text
+    
+    #resumed run: the schedule entry of the plate and step to restart in
+    resume_plate = protocol.params.resume_plate - 1 if plate_count > 1 else 0
+    resume["entry"] = next((n for n, entry in enumerate(schedule) if entry["plate"] == resume_plate and entry["step"] == resume_step), None)
+    if resume["entry"] is None:
+        raise ValueError("Resume at plate " + str(resume_plate + 1) + " is outside the batch of " + str(plate_count) + " plate(s)")
+    
+    prepare_racks(schedule[0]["step"])
+    if resume["entry"] or resume["part"] or resume["index"] > 1:
+        resume_name = [choice["display_name"] for choice in RESUME_CHOICES if choice["value"] == protocol.params.resume_from][0]
+        racks_text = "Leave the tip racks as the stopped run left them"
+        #resumed at the beads: the bead pause that swaps the standard curve's tip rack is skipped
+        if tip_plan["refresh"] and resume_step == 1 and resume["entry"] == 0 and STEP_PARTS[1][resume["part"]][0] == "beads":
+            racks_text += " but put a full 50ul tip rack in " + tip_plan["refresh"]
+            reagent_racks[tip_plan["refresh"]].reset()
+        #resumed in the standard curve: the stopped column is rebuilt from row A with the same single tip column
+        if standard_plan and resume_step == 1 and resume["entry"] == 0 and STEP_PARTS[1][resume["part"]][0] == "standards" and resume["index"] <= len(standard_plan["columns"]):
+            slot, tip_column = tip_passes["standards"]["picks"][resume["index"] - 1]
+            racks_text += " but refill tip column " + str(tip_column) + " of the rack in " + slot + " and set up source column " + str(standard_plan["columns"][resume["index"] - 1]) + " again (top standard in row A, rows B-H empty)"
+        operator_pause(plate_tag(resume_plate) + "Resuming at " + resume_name + ", group/round " + str(resume["index"]) + ", everything before it is skipped. " + racks_text + ", stage the reagents still needed, put the plate on " + deck["dest"] + " (vacuum it first if its last wash round was not vacuumed), then click 'Resume'.")
+    
+    for n, entry in enumerate(schedule):
+        plate, step = entry["plate"], entry["step"]
+        following = schedule[n + 1] if n + 1 < len(schedule) else None
+        #resumed run: steps before the restart point already ran, only their tip rack bookkeeping is replayed
+        if n < resume["entry"]:
+            if following is not None:
+                prepare_racks(following["step"])
+            continue
+        position["entry"], position["step"] = n, step
+        #run log: every event until the next step belongs to this plate and step
+        run_log.plate, run_log.step = PLATE_NAMES[plate], step
+        with run_log.record("step"):
+            steps[step](plate)
         
-    #Wash and wait 4 times. 
-    for i in range(1, 5):   
-        #pre-dispense 10
-        pipette.dispense(10, wash_reservoir['A1'])  
-        #dispense sequentially to all 4 quadrants    
-        pipette.dispense(40, dest_plate['A1'].bottom(z=well_height_wash), rate=wash_rate)  # Top-left quadrant
-        pipette.dispense(40, dest_plate['A2'].bottom(z=well_height_wash), rate=wash_rate)  # Top-left quadrant
-        pipette.dispense(40, dest_plate['B1'].bottom(z=well_height_wash), rate=wash_rate)  # Top-left quadrant
-        pipette.dispense(40, dest_plate['B2'].bottom(z=well_height_wash), rate=wash_rate)  # Top-left quadrant
-        if i!=5:
-            #Aspirate 200ul from the source plate (96-well) into the pipette tip
-            pipette.aspirate(170, wash_reservoir['A1']) 
-            protocol.pause("Dispense " + str(i) + "/4 complete. Please vacuum and place back the filter plate.")
-        else:
-            pipette.aspirate(90, wash_reservoir['A1']) 
-            #pre-dispense 10
-            pipette.dispense(10, wash_reservoir['A1'])  
-            #dispense sequentially to all 4 quadrants    
-            pipette.dispense(20, dest_plate['A1'].bottom(z=well_height_wash), rate=wash_rate)  # Top-left quadrant
-            pipette.dispense(20, dest_plate['A2'].bottom(z=well_height_wash), rate=wash_rate)  # Top-left quadrant
-            pipette.dispense(20, dest_plate['B1'].bottom(z=well_height_wash), rate=wash_rate)  # Top-left quadrant
-            pipette.dispense(20, dest_plate['B2'].bottom(z=well_height_wash), rate=wash_rate)  # Top-left quadrant
-            protocol.comment("Dispense " + str(i) + "Do not vacuum, final dispense, ready for run.")
-    
-    #empty wash buffer 
-    pipette.blow_out(trash)
-    #return wash tips
-    pipette.return_tip() 
-
-#endregion   
\ No newline at end of file
+            #end of step: incubation / vacuum instructions, what goes on deck next and what the next step needs staged
+            message = plate_tag(plate) + step_done[step]
+            operator_needed = step < 4 or following is not None
+            if incubation != "pause" and step < 4:
+                #timed: the robot waits out the incubation, only the vacuum before the step 4 wash stops the run
+                incubate(INCUBATION_MINUTES[step], plate_tag(plate))
+                message = step_timed_done[step]
+                operator_needed = step == 3
+            if plate_count > 1:
+                if not message.endswith((".", "!")):
+                    message += "."
+                if step < 4:
+                    message += " Back on deck at about +" + str(round(entry["end"] + INCUBATION_MINUTES[step])) + " min."
+            if following is not None:
+                fresh = prepare_racks(following["step"])
+                if plate_count > 1:
+                    message += handover(following, plate, fresh)
+                if following["step"] in step_reagent and reagent_mode == "full":
+                    message += stage_prompt(step_reagent[following["step"]])
+                    operator_needed = True
+            if operator_needed:
+                vacuum_pause(message)
+        protocol.comment(plate_tag(plate) + run_log.step_summary(PLATE_NAMES[plate], step))
+#endregion
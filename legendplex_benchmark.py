@@ -0,0 +1,215 @@
+"""Performance benchmark for the LEGENDPLEX protocol with regression gates.
+
+Records the protocol for a fixed set of plate layouts and settings with the
+recording context from ``legendplex_timing`` and collects, per scenario:
+
+- command counts by type
+- estimated duration (incubations run as operator pauses, so this is robot time)
+- tips used per rack slot (tips picked up minus tips returned)
+- volume drawn from each source labware (aspirated minus dispensed back)
+
+The metrics are compared with ``benchmark_baseline.json``. A metric that got
+worse (higher) than its baseline by more than the tolerance fails the run
+with exit status 1, so the benchmark can gate a commit or a CI job.
+
+Usage:
+    python legendplex_benchmark.py
+    python legendplex_benchmark.py --tolerance 0.05
+    python legendplex_benchmark.py --scenario half_plate --scenario full_head
+    python legendplex_benchmark.py --update-baseline
+"""
+
+import argparse
+import json
+import os
+import sys
+from collections import OrderedDict
+
+from legendplex_timing import (
+    DEFAULT_PROTOCOL,
+    RecordedCSV,
+    estimate,
+    load_protocol,
+    record_protocol,
+)
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(HERE, "benchmark_baseline.json")
+
+# relative tolerance per metric group, overridable with --tolerance
+DEFAULT_TOLERANCE = 0.02
+
+
+def _sample_map(*contents):
+    rows = ["column,content"] + [f"{n},{content}" for n, content in enumerate(contents, 1)]
+    return RecordedCSV("\n".join(rows))
+
+
+# name -> runtime parameter overrides; everything not listed keeps its default
+SCENARIOS = OrderedDict([
+    ("full_plate", {}),
+    ("half_plate", {"sample_map": _sample_map("standard", "sample", "sample", "sample",
+                                              "sample", "sample", "blank")}),
+    ("standards_only", {"sample_map": _sample_map("standard", "", "", "", "", "", "",
+                                                  "", "", "", "", "blank")}),
+    ("full_head", {"reagent_mode": "full"}),
+    ("wash_1000ul", {"wash_tips": "1000"}),
+    ("batch_2_plates", {"plate_count": 2}),
+    ("resume_step_2", {"resume_from": "2:detection", "resume_index": 7}),
+    ("validation_3_groups", {"run_mode": "validation", "validation_groups": 3}),
+    ("bead_remix_90s", {"bead_mixing": "seconds", "bead_remix_seconds": 90}),
+    ("standards_on_deck", {"standard_prep": "deck"}),
+])
+
+# every scenario runs incubations as pauses so the duration is robot work only
+COMMON_PARAMS = {"incubation": "pause"}
+
+
+# region metrics
+##################################################################################
+def scenario_metrics(commands, model):
+    """Benchmark metrics of one recorded run."""
+    counts = OrderedDict()
+    tips = OrderedDict()
+    drawn = OrderedDict()
+    for command in commands:
+        counts[command.kind] = counts.get(command.kind, 0) + 1
+        if command.kind == "pick_up_tip":
+            tips[command.slot] = tips.get(command.slot, 0) + command.channels
+        elif command.kind == "return_tip":
+            tips[command.slot] = tips.get(command.slot, 0) - command.channels
+        elif command.kind == "aspirate":
+            drawn[command.labware] = drawn.get(command.labware, 0.0) + command.volume * command.channels
+    # volume that goes back into a source (pre-dispense, excess) was not used up
+    for command in commands:
+        if command.kind == "dispense" and command.labware in drawn:
+            drawn[command.labware] -= command.volume * command.channels
+    return OrderedDict([
+        ("seconds", round(estimate(commands, model).total, 1)),
+        ("commands", OrderedDict(sorted(counts.items()))),
+        ("tips", OrderedDict(sorted(tips.items()))),
+        ("volume_ul", OrderedDict(sorted((name, round(volume, 1)) for name, volume in drawn.items()))),
+    ])
+
+
+def run_benchmark(path=DEFAULT_PROTOCOL, names=None):
+    """Metrics for every selected scenario, keyed by scenario name."""
+    module = load_protocol(path)
+    results = OrderedDict()
+    for name, params in SCENARIOS.items():
+        if names and name not in names:
+            continue
+        context = record_protocol(path, dict(COMMON_PARAMS, **params), module=module)
+        results[name] = scenario_metrics(context.commands, context.model)
+    return results
+
+
+def _flatten(metrics):
+    """(metric, value) pairs such as ("tips B1", 96) from one scenario's metrics."""
+    yield "seconds", metrics["seconds"]
+    for group in ("commands", "tips", "volume_ul"):
+        for key, value in metrics[group].items():
+            yield f"{group} {key}", value
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Regressions and changes against the baseline.
+
+    Returns (regressions, changes); each entry is (scenario, metric, old, new).
+    Lower is better for every metric, so a value above baseline x (1 + tolerance)
+    is a regression. A metric missing from the baseline counts from zero.
+    """
+    regressions, changes = [], []
+    for scenario, metrics in results.items():
+        if scenario not in baseline:
+            changes.append((scenario, "(new scenario)", None, None))
+            continue
+        old = dict(_flatten(baseline[scenario]))
+        new = dict(_flatten(metrics))
+        for metric in sorted(set(old) | set(new)):
+            before, after = old.get(metric, 0), new.get(metric, 0)
+            if abs(after - before) < 1e-6:
+                continue
+            entry = (scenario, metric, before, after)
+            changes.append(entry)
+            if after > before * (1 + tolerance) + 1e-6:
+                regressions.append(entry)
+    return regressions, changes
+# endregion
+
+
+# region cli
+##################################################################################
+def read_baseline(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as handle:
+        return json.load(handle)
+
+
+def write_baseline(path, results):
+    with open(path, "w") as handle:
+        json.dump(results, handle, indent=2)
+        handle.write("\n")
+
+
+def format_results(results):
+    lines = [f"  {'scenario':<20}{'minutes':>9}{'commands':>10}{'tips':>7}{'drawn ml':>10}"]
+    for name, metrics in results.items():
+        lines.append(f"  {name:<20}{metrics['seconds'] / 60:9.1f}"
+                     f"{sum(metrics['commands'].values()):10d}"
+                     f"{sum(metrics['tips'].values()):7d}"
+                     f"{sum(metrics['volume_ul'].values()) / 1000:10.1f}")
+    return "\n".join(lines)
+
+
+def format_changes(changes, regressions, tolerance):
+    if not changes:
+        return "No change against the baseline."
+    failed = set(regressions)
+    lines = [f"Changes against the baseline (tolerance {tolerance:.1%}):"]
+    for entry in changes:
+        scenario, metric, before, after = entry
+        if before is None:
+            lines.append(f"  {scenario}: not in the baseline")
+            continue
+        mark = "REGRESSION" if entry in failed else ("better" if after < before else "within tolerance")
+        lines.append(f"  {scenario:<20}{metric:<32}{before:>10g} -> {after:<10g} {mark}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("protocol", nargs="?", default=DEFAULT_PROTOCOL)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="allowed relative increase of any metric (default 0.02)")
+    parser.add_argument("--scenario", action="append", choices=list(SCENARIOS),
+                        help="run only this scenario (repeatable)")
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="store the current metrics as the new baseline")
+    parser.add_argument("--json", action="store_true", help="print the metrics as JSON")
+    args = parser.parse_args(argv)
+
+    results = run_benchmark(args.protocol, args.scenario)
+    print(json.dumps(results, indent=2) if args.json else format_results(results))
+
+    if args.update_baseline:
+        # keep the stored figures of scenarios that were not run this time
+        write_baseline(args.baseline, dict(read_baseline(args.baseline), **results))
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    baseline = read_baseline(args.baseline)
+    if not baseline:
+        print(f"No baseline at {args.baseline}; run with --update-baseline first.")
+        return 1
+    regressions, changes = compare(results, baseline, args.tolerance)
+    print()
+    print(format_changes(changes, regressions, args.tolerance))
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
+# endregion
@@ -0,0 +1,232 @@
+"""Single-pass, cached ingest of the LEGENDplex results workbook.
+
+Reads every marker sheet from ``IL-17A`` to ``Granulysin`` in one pass over
+the workbook, splits ``Sample`` (``P4_2W``) into patient and timepoint the same
+way the R analysis does (text before the first ``_`` and, upper-cased, after
+the last one), attaches the SOC/Belatacept group and returns one long-format
+table with one row per marker and sample.
+
+The table is cached next to the workbook, keyed by a hash of the workbook
+bytes and the group assignment, so later loads skip Excel parsing entirely
+and a new export is parsed again only when its contents change. The cache is
+Parquet when pyarrow is installed (readable from R with ``arrow``) and NPZ
+otherwise.
+
+Usage:
+    python legendplex_ingest.py
+    python legendplex_ingest.py NK_SCDL3991_Flow_Data.xlsx --csv long.csv
+    python legendplex_ingest.py --refresh
+
+From Python:
+    from legendplex_ingest import load
+    data = load("NK_SCDL3991_Flow_Data.xlsx")
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_WORKBOOK = os.path.join(HERE, "NK_SCDL3991_Flow_Data.xlsx")
+CACHE_DIR_NAME = ".legendplex_cache"
+
+# bump when the table layout changes so old caches are not reused
+INGEST_VERSION = 2
+
+FIRST_MARKER = "IL-17A"
+LAST_MARKER = "Granulysin"
+
+# sample groups, as in NK_SCDL3991_R_Final.Rmd
+SOC_SAMPLES = ["P1", "P2", "P4", "P10", "P21", "P23", "PM1", "PM2", "PM3", "PM5", "PM6", "PM7", "PM9"]
+BELATACEPT_SAMPLES = ["P6", "P17", "P20", "P26", "P28", "P32", "PA34", "PA38", "PA39"]
+DEFAULT_GROUPS = dict([(patient, "SOC") for patient in SOC_SAMPLES]
+                      + [(patient, "Belatacept") for patient in BELATACEPT_SAMPLES])
+
+# patient before the first underscore, timepoint after the last one
+SAMPLE_PATTERN = r"^(?P<Patient>[^_]*)_(?:.*_)?(?P<Timepoint>[^_]*)$"
+
+# columns of the long table; everything else in a marker sheet is kept as well
+KEY_COLUMNS = ["Marker", "Sample", "Patient", "Timepoint", "Group"]
+STRING_COLUMNS = set(KEY_COLUMNS)
+
+
+# region parsing
+##################################################################################
+def marker_sheets(sheet_names, first=FIRST_MARKER, last=LAST_MARKER):
+    """Sheet names from ``first`` to ``last`` inclusive, in workbook order."""
+    names = list(sheet_names)
+    for name in (first, last):
+        if name not in names:
+            raise ValueError(f"sheet {name!r} not found in the workbook ({', '.join(names)})")
+    return names[names.index(first):names.index(last) + 1]
+
+
+def read_workbook(path, groups=None):
+    """Long-format table of every marker sheet, parsed in one pass.
+
+    Rows whose ``Sample`` has no ``_`` (standards, blanks, notes) are dropped,
+    as the R analysis does. ``Group`` is empty for patients in no group.
+    """
+    groups = DEFAULT_GROUPS if groups is None else groups
+    with pd.ExcelFile(path) as workbook:
+        sheets = marker_sheets(workbook.sheet_names)
+        frames = workbook.parse(sheet_name=sheets)
+    data = pd.concat(
+        [frame.assign(Marker=name) for name, frame in frames.items()],
+        ignore_index=True,
+    )
+    data["Sample"] = data["Sample"].astype("string").str.strip()
+    data = data[data["Sample"].str.contains("_", na=False)].reset_index(drop=True)
+    parts = data["Sample"].str.extract(SAMPLE_PATTERN)
+    data["Patient"] = parts["Patient"]
+    data["Timepoint"] = parts["Timepoint"].str.upper()
+    data["Group"] = data["Patient"].map(groups).fillna("").astype("string")
+    values = [column for column in data.columns if column not in STRING_COLUMNS]
+    data = data[KEY_COLUMNS + values]
+    data["Marker"] = pd.Categorical(data["Marker"], categories=sheets, ordered=True)
+    return data
+# endregion
+
+
+# region cache
+##################################################################################
+def _parquet_available():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def cache_key(path, groups=None):
+    """Hash of the workbook bytes, the group assignment and the ingest version."""
+    groups = DEFAULT_GROUPS if groups is None else groups
+    digest = hashlib.sha256()
+    with open(path, "rb") as handle:
+        for chunk in iter(lambda: handle.read(1 << 20), b""):
+            digest.update(chunk)
+    digest.update(json.dumps(sorted(groups.items())).encode())
+    digest.update(str(INGEST_VERSION).encode())
+    return digest.hexdigest()[:16]
+
+
+def cache_path(path, groups=None, cache_dir=None):
+    cache_dir = cache_dir or os.path.join(os.path.dirname(os.path.abspath(path)), CACHE_DIR_NAME)
+    stem = os.path.splitext(os.path.basename(path))[0]
+    extension = ".parquet" if _parquet_available() else ".npz"
+    return os.path.join(cache_dir, f"{stem}-{cache_key(path, groups)}{extension}")
+
+
+def write_cache(data, target):
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    partial = target + ".tmp"
+    if target.endswith(".parquet"):
+        data.to_parquet(partial, index=False)
+    else:
+        # plain fixed-width arrays, so loading needs no pickle
+        arrays = {}
+        text_columns = []
+        for column in data.columns:
+            values = data[column]
+            if column in STRING_COLUMNS:
+                arrays[column] = values.astype(str).to_numpy(dtype=str)
+                continue
+            array = _numeric_array(values)
+            if array is None:
+                # text or mixed values (notes such as "<LLOQ"), missing ones stored as ""
+                array = values.astype("string").fillna("").to_numpy(dtype=str)
+                text_columns.append(column)
+            arrays[column] = array
+        arrays["__columns__"] = np.array(list(data.columns), dtype=str)
+        arrays["__text__"] = np.array(text_columns, dtype=str)
+        arrays["__markers__"] = np.array(list(data["Marker"].cat.categories), dtype=str)
+        with open(partial, "wb") as handle:
+            np.savez(handle, **arrays)
+    os.replace(partial, target)
+
+
+def _numeric_array(values):
+    """Values as a plain numeric (or datetime) array, None when they are not all numbers."""
+    if values.dtype.kind in "biufmM" and not isinstance(values.dtype, pd.api.extensions.ExtensionDtype):
+        return values.to_numpy()
+    numeric = pd.to_numeric(values, errors="coerce")
+    if numeric.notna().sum() != values.notna().sum():
+        return None
+    return numeric.to_numpy(dtype=float, na_value=np.nan)
+
+
+def read_cache(target):
+    if target.endswith(".parquet"):
+        return pd.read_parquet(target)
+    with np.load(target, allow_pickle=False) as arrays:
+        columns = list(arrays["__columns__"])
+        data = pd.DataFrame({column: arrays[column] for column in columns})
+        markers = list(arrays["__markers__"])
+        text_columns = list(arrays["__text__"])
+    for column in STRING_COLUMNS:
+        data[column] = data[column].astype("string")
+    for column in text_columns:
+        data[column] = data[column].astype("string").replace("", pd.NA)
+    data["Marker"] = pd.Categorical(data["Marker"], categories=markers, ordered=True)
+    return data
+
+
+def load(path=DEFAULT_WORKBOOK, groups=None, cache_dir=None, refresh=False):
+    """Long-format marker table, from the cache when the workbook is unchanged."""
+    target = cache_path(path, groups, cache_dir)
+    if not refresh and os.path.exists(target):
+        try:
+            return read_cache(target)
+        except (OSError, ValueError, KeyError):
+            # unreadable cache (older layout, interrupted write): parse the workbook again
+            pass
+    data = read_workbook(path, groups)
+    write_cache(data, target)
+    return data
+# endregion
+
+
+# region cli
+##################################################################################
+def format_summary(data):
+    groups = data.drop_duplicates("Patient")["Group"].replace("", "(none)").value_counts()
+    lines = [
+        f"{len(data)} rows, {data['Marker'].nunique()} markers, {data['Patient'].nunique()} patients",
+        "markers:    " + ", ".join(data["Marker"].cat.categories),
+        "timepoints: " + ", ".join(sorted(data["Timepoint"].dropna().unique())),
+        "patients:   " + ", ".join(f"{group} {count}" for group, count in groups.items()),
+    ]
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("workbook", nargs="?", default=DEFAULT_WORKBOOK)
+    parser.add_argument("--cache-dir", help=f"cache directory (default {CACHE_DIR_NAME} next to the workbook)")
+    parser.add_argument("--refresh", action="store_true", help="parse the workbook even if it is cached")
+    parser.add_argument("--csv", metavar="PATH", help="also write the long table as CSV")
+    args = parser.parse_args(argv)
+
+    target = cache_path(args.workbook, cache_dir=args.cache_dir)
+    cached = os.path.exists(target) and not args.refresh
+    started = time.perf_counter()
+    data = load(args.workbook, cache_dir=args.cache_dir, refresh=args.refresh)
+    elapsed = time.perf_counter() - started
+
+    print(format_summary(data))
+    print(f"{'loaded from' if cached else 'parsed and cached to'} {target} in {elapsed * 1000:.0f} ms")
+    if args.csv:
+        data.to_csv(args.csv, index=False)
+        print(f"written to {args.csv}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
+# endregion
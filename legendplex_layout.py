@@ -0,0 +1,311 @@
+"""Deck layout search for the LEGENDPLEX protocol.
+
+Records the protocol once, then re-prices its gantry moves for other slot
+assignments of the labware in ``DECK_LAYOUT``. Every recorded position keeps
+its offset within the labware and only the slot origin changes, so one
+recording is enough to price any layout.
+
+Candidate layouts must keep the trash bin and the 384 plate in column 1 or 3
+and must pass the protocol's own tip planner (``plan_tips``) without a clash
+between a COLUMN or SINGLE pickup and a tip rack (with the on-deck standard
+curve, the single tip work in the source plate and the buffer reservoir is
+checked as well). The search is a best-swap hill climb from the current
+layout plus seeded random restarts. ``--write`` changes the layout of every
+run, so the layout it writes must also pass in every reagent mode, batch and
+standard curve setting, for the full plate as well as the given sample map.
+
+Usage:
+    python legendplex_layout.py
+    python legendplex_layout.py --param reagent_mode=full --top 3
+    python legendplex_layout.py --write
+"""
+
+import argparse
+import random
+import re
+import sys
+from collections import Counter, OrderedDict
+from dataclasses import replace
+
+from legendplex_timing import (
+    DEFAULT_PROTOCOL,
+    SLOT_ORIGINS,
+    TimingModel,
+    estimate,
+    load_protocol,
+    parse_params,
+    plate_layout,
+    protocol_parameters,
+    record_protocol,
+    travel_seconds,
+)
+
+DECK_SLOTS = [row + column for row in "ABCD" for column in "123"]
+
+# roles that only fit in some deck columns: the trash bin, and the 384 plate
+# because the heater-shaker that can carry it goes in column 1 or 3
+ROLE_COLUMNS = {"trash": "13", "dest": "13"}
+
+
+# region layouts
+##################################################################################
+def flatten(deck):
+    """{role: slot} with one role per reagent rack (``reagent_tips 1`` ...)."""
+    roles = OrderedDict()
+    for role, slot in deck.items():
+        if isinstance(slot, list):
+            for n, rack_slot in enumerate(slot, 1):
+                roles[f"{role} {n}"] = rack_slot
+        else:
+            roles[role] = slot
+    return roles
+
+
+def unflatten(roles, template):
+    """Back to the protocol's DECK_LAYOUT shape."""
+    deck = OrderedDict()
+    for role, slot in template.items():
+        if isinstance(slot, list):
+            deck[role] = [roles[f"{role} {n}"] for n in range(1, len(slot) + 1)]
+        else:
+            deck[role] = roles[role]
+    return deck
+
+
+def layout_problems(module, roles, template, tip_layouts):
+    """Reasons a layout cannot run; empty when it is allowed."""
+    problems = []
+    slots = list(roles.values())
+    if len(set(slots)) != len(slots):
+        problems.append("two labware share a slot")
+    for role, columns in ROLE_COLUMNS.items():
+        if role in roles and roles[role][1] not in columns:
+            problems.append(f"{role} in {roles[role]} is not in column {' or '.join(columns)}")
+    deck = unflatten(roles, template)
+    for layout, mode, separate_steps, standards in tip_layouts:
+        plan = module.plan_tips(layout, mode, deck, separate_steps=separate_steps, standards=standards)
+        problems += [f"{reagent} at {slot} reaches past the deck edge" if neighbour == "deck edge"
+                     else f"{reagent} at {slot} hangs over the rack in {neighbour}"
+                     for reagent, slot, neighbour in plan["clashes"]]
+    return problems
+
+
+def run_tip_layouts(layout, values):
+    """The tip plans of one run with these parameter values, single plate and batch (the
+    on-deck standard curve runs on single plates only)."""
+    standards = values["reagent_mode"] != "full" and values["standard_prep"] == "deck"
+    return [(layout, values["reagent_mode"], False, standards), (layout, values["reagent_mode"], True, False)]
+
+
+def every_tip_layout(module, layout):
+    """The tip plans of every run a written DECK_LAYOUT affects: both reagent modes, single
+    plates and batches, with and without the on-deck standard curve, for this sample map and
+    the full plate."""
+    layouts = [layout, module.PlateLayout(module.FULL_PLATE_MAP)]
+    return [(plate, mode, separate_steps, standards)
+            for plate in layouts for mode in ("column", "full") for separate_steps in (False, True)
+            for standards in ((False, True) if mode == "column" and not separate_steps else (False,))]
+# endregion
+
+
+# region travel pricing
+##################################################################################
+class TravelTrace:
+    """Gantry moves of one recording, priced for any slot assignment."""
+
+    def __init__(self, commands, roles, model=None):
+        self.model = model or TimingModel()
+        self.commands = commands
+        self.roles = roles
+        role_of_slot = {slot: role for role, slot in roles.items()}
+        points = []
+        for command in commands:
+            if not command.slot:
+                continue
+            origin = SLOT_ORIGINS[command.slot]
+            points.append((role_of_slot[command.slot], command.x - origin[0], command.y - origin[1],
+                           command.z, command.labware))
+        # identical moves are priced once and weighted by how often they happen
+        self.moves = Counter(
+            (a[:4], b[:4], a[4] == b[4]) for a, b in zip(points, points[1:])
+        )
+
+    def seconds(self, roles):
+        """Gantry travel time with every role in the slot ``roles`` gives it."""
+        total = 0.0
+        for (a, b, same_labware), count in self.moves.items():
+            start = self._point(roles, a)
+            end = self._point(roles, b)
+            total += count * travel_seconds(self.model, start, end, same_labware)
+        return total
+
+    @staticmethod
+    def _point(roles, point):
+        role, dx, dy, z = point
+        origin = SLOT_ORIGINS[roles[role]]
+        return (origin[0] + dx, origin[1] + dy, z)
+
+    def relocated(self, roles):
+        """The recorded commands moved to the slots of ``roles``."""
+        role_of_slot = {slot: role for role, slot in self.roles.items()}
+        moved = []
+        for command in self.commands:
+            if not command.slot:
+                moved.append(command)
+                continue
+            old, new = SLOT_ORIGINS[command.slot], SLOT_ORIGINS[roles[role_of_slot[command.slot]]]
+            moved.append(replace(command, slot=roles[role_of_slot[command.slot]],
+                                 x=command.x - old[0] + new[0], y=command.y - old[1] + new[1]))
+        return moved
+# endregion
+
+
+# region search
+##################################################################################
+def hill_climb(roles, cost, allowed):
+    """Best single swap (or move to a free slot) until nothing improves."""
+    roles = OrderedDict(roles)
+    best = cost(roles)
+    while True:
+        improvement = None
+        names = list(roles)
+        free = [slot for slot in DECK_SLOTS if slot not in roles.values()]
+        candidates = [(a, b) for i, a in enumerate(names) for b in names[i + 1:]]
+        candidates += [(a, slot) for a in names for slot in free]
+        for a, b in candidates:
+            trial = OrderedDict(roles)
+            if b in roles:
+                trial[a], trial[b] = roles[b], roles[a]
+            else:
+                trial[a] = b
+            if not allowed(trial):
+                continue
+            seconds = cost(trial)
+            if seconds < best - 1e-6 and (improvement is None or seconds < improvement[0]):
+                improvement = (seconds, trial)
+        if improvement is None:
+            return best, roles
+        best, roles = improvement
+
+
+def search(trace, start, allowed, restarts=20, seed=0):
+    """Distinct local optima, best first, as [(travel seconds, roles)]."""
+    rng = random.Random(seed)
+    found = {}
+    seeds = [start]
+    names = list(start)
+    while len(seeds) < restarts + 1:
+        slots = rng.sample(DECK_SLOTS, len(names))
+        candidate = OrderedDict(zip(names, slots))
+        if allowed(candidate):
+            seeds.append(candidate)
+    for roles in seeds:
+        seconds, roles = hill_climb(roles, trace.seconds, allowed)
+        found[tuple(roles.values())] = (seconds, roles)
+    return sorted(found.values(), key=lambda item: item[0])
+
+
+def optimise(path=DEFAULT_PROTOCOL, params=None, restarts=20, seed=0, every_mode=False):
+    """Current and best layouts with their travel and estimated run seconds.
+
+    ``every_mode`` only allows layouts that every run of the protocol accepts (for ``--write``).
+    """
+    module = load_protocol(path)
+    values = protocol_parameters(module, params)
+    template = module.DECK_LAYOUT
+    current = flatten(template)
+    context = record_protocol(path, params, module=module)
+    trace = TravelTrace(context.commands, current, context.model)
+    layout = plate_layout(module, values)
+    tip_layouts = run_tip_layouts(layout, values)
+    if every_mode:
+        tip_layouts += every_tip_layout(module, layout)
+
+    def allowed(roles):
+        return not layout_problems(module, roles, template, tip_layouts)
+
+    def result(seconds, roles):
+        return {
+            "deck": unflatten(roles, template),
+            "travel": seconds,
+            "total": estimate(trace.relocated(roles), trace.model).total,
+            # reasons this run cannot use the layout (the current one may have some)
+            "problems": layout_problems(module, roles, template, tip_layouts),
+        }
+
+    ranked = search(trace, current, allowed, restarts, seed)
+    return result(trace.seconds(current), current), [result(*entry) for entry in ranked]
+# endregion
+
+
+# region cli
+##################################################################################
+def format_deck(deck):
+    """The layout as a DECK_LAYOUT literal, ready to paste into the protocol."""
+    lines = ["DECK_LAYOUT = {"]
+    for role, slot in deck.items():
+        value = "[" + ", ".join(f'"{s}"' for s in slot) + "]" if isinstance(slot, list) else f'"{slot}"'
+        lines.append(f'    "{role}": {value},')
+    lines.append("}")
+    return "\n".join(lines)
+
+
+def format_grid(deck):
+    where = {}
+    for role, slot in flatten(deck).items():
+        where[slot] = role
+    rows = []
+    for row in "ABCD":
+        rows.append("  " + " | ".join(f"{row}{c} {where.get(row + c, '-'):<14}" for c in "123"))
+    return "\n".join(rows)
+
+
+def write_deck(path, deck):
+    with open(path) as handle:
+        text = handle.read()
+    text, count = re.subn(r"^DECK_LAYOUT = \{.*?^\}", format_deck(deck), text, count=1,
+                          flags=re.S | re.M)
+    if not count:
+        raise SystemExit(f"no DECK_LAYOUT block found in {path}")
+    with open(path, "w") as handle:
+        handle.write(text)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("protocol", nargs="?", default=DEFAULT_PROTOCOL)
+    parser.add_argument("--param", action="append", metavar="NAME=VALUE",
+                        help="override a runtime parameter (repeatable)")
+    parser.add_argument("--restarts", type=int, default=20, help="random restarts of the search")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--top", type=int, default=5, help="layouts to list")
+    parser.add_argument("--write", action="store_true",
+                        help="replace DECK_LAYOUT in the protocol with the best layout every mode accepts")
+    args = parser.parse_args(argv)
+
+    current, ranked = optimise(args.protocol, parse_params(args.param), args.restarts, args.seed,
+                               every_mode=args.write)
+    print(f"current layout: travel {current['travel'] / 60:.1f} min, run {current['total'] / 60:.1f} min")
+    print(format_grid(current["deck"]))
+    print()
+    for n, entry in enumerate(ranked[:args.top], 1):
+        saved = current["travel"] - entry["travel"]
+        print(f"#{n}: travel {entry['travel'] / 60:.1f} min ({saved / 60:+.1f} min saved), "
+              f"run {entry['total'] / 60:.1f} min")
+        print(format_grid(entry["deck"]))
+        print()
+    best = ranked[0]
+    print(format_deck(best["deck"]))
+    if args.write:
+        # the search only allowed layouts every mode accepts, checked once more before the edit
+        if best["problems"]:
+            print("not written: " + "; ".join(best["problems"]))
+            return 1
+        write_deck(args.protocol, best["deck"])
+        print(f"written to {args.protocol} (checked in both reagent modes, batches and the on-deck standard curve)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
+# endregion
@@ -0,0 +1,295 @@
+"""Parameter sweep for the LEGENDPLEX protocol, run across CPU cores.
+
+Records the protocol with the recording context from ``legendplex_timing``
+for every combination of the given settings, in a process pool, and collects
+per combination:
+
+- estimated run time (incubations as pauses, so robot time only)
+- tips used and reagent drawn (as in ``legendplex_benchmark``)
+- the smallest volume left in a tip after its last dispense into the 384 plate
+- the simulation error, if the run fails (volume exceeded, out of tips, ...)
+
+A combination is safe when it records without an error, never moves below a
+well bottom and keeps at least ``--min-reserve`` uL in every tip. The report
+lists the safe combinations that are Pareto-optimal for run time, tips and
+reagent drawn.
+
+A setting is a runtime parameter of the protocol (``touch_beads``,
+``reagent_mode``, ...), one of the named settings in ``SETTINGS``, or a path
+into a table of the protocol (``LIQUID_CLASSES.sample.delay``, ``*`` matches
+every key). Values are a comma list or an inclusive ``start:stop:step`` range.
+
+Usage:
+    python legendplex_sweep.py --sweep wash_rate=2:5:1 --sweep well_height_wash=10,12,14
+    python legendplex_sweep.py --sweep aspirate_reagent=28:34:2 --sweep touch_v_offset=-11:-7:1
+    python legendplex_sweep.py --sweep LIQUID_CLASSES.sample.delay=0,2,5 --param reagent_mode=full
+"""
+
+import argparse
+import itertools
+import json
+import os
+import sys
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from legendplex_benchmark import COMMON_PARAMS, scenario_metrics
+from legendplex_timing import (
+    DEFAULT_PROTOCOL,
+    SimulationError,
+    load_protocol,
+    parse_params,
+    protocol_parameters,
+    record_protocol,
+)
+
+DEST_LOAD_NAME = "agilent_384_wellplate_140ul"
+
+# named settings -> table paths in the protocol they set
+SETTINGS = OrderedDict([
+    ("well_height_sample", ["LABWARE_HEIGHTS.agilent_384_wellplate_140ul.dispense"]),
+    ("well_height_wash", ["LIQUID_CLASSES.wash.dispense_height"]),
+    ("touch_v_offset", ["LIQUID_CLASSES.*.touch_v_offset"]),
+    ("wash_rate", ["LIQUID_CLASSES.wash.dispense_rate"]),
+    ("sample_rate", ["LIQUID_CLASSES.standard.dispense_rate", "LIQUID_CLASSES.sample.dispense_rate"]),
+    ("aspirate_matrix", ["ASPIRATE_VOLUMES.matrix"]),
+    ("aspirate_buffer", ["ASPIRATE_VOLUMES.buffer"]),
+    ("aspirate_reagent", ["ASPIRATE_VOLUMES.beads", "ASPIRATE_VOLUMES.detection",
+                          "ASPIRATE_VOLUMES.sape"]),
+])
+
+# objectives of the Pareto report, all lower is better
+OBJECTIVES = ("seconds", "tips", "drawn_ul")
+
+DEFAULT_MIN_RESERVE = 2.0
+
+
+# region settings
+##################################################################################
+def parse_values(text):
+    """Values of one setting: ``a,b,c`` or an inclusive ``start:stop:step`` range.
+
+    Numbers are parsed for the table settings; runtime parameters get their declared type
+    in ``combinations``.
+    """
+    if ":" in text:
+        start, stop, step = (float(part) for part in text.split(":"))
+        if step <= 0:
+            raise ValueError(f"range step must be positive: {text!r}")
+        count = int(round((stop - start) / step)) + 1
+        values = [round(start + n * step, 6) for n in range(count)]
+        return [int(value) if value == int(value) else value for value in values]
+    return [_number(value.strip()) for value in text.split(",") if value.strip()]
+
+
+def _number(text):
+    for kind in (int, float):
+        try:
+            return kind(text)
+        except ValueError:
+            pass
+    return text
+
+
+def parse_sweep(pairs):
+    """OrderedDict of setting -> values from ``name=values`` pairs."""
+    sweep = OrderedDict()
+    for pair in pairs or []:
+        name, sep, values = pair.partition("=")
+        if not sep or not values.strip():
+            raise SystemExit(f"--sweep expects name=values, got {pair!r}")
+        sweep[name.strip()] = parse_values(values)
+    return sweep
+
+
+def table_paths(name):
+    """Table paths a setting writes, [] for a runtime parameter."""
+    if name in SETTINGS:
+        return SETTINGS[name]
+    if "." in name:
+        return [name]
+    return []
+
+
+def apply_override(module, path, value):
+    """Set one table path (``TABLE.key.key``, ``*`` for every key) on the module."""
+    table, *keys = path.split(".")
+    if not hasattr(module, table):
+        raise SimulationError(f"the protocol has no table {table!r}")
+    targets = [getattr(module, table)]
+    for key in keys[:-1]:
+        targets = [entry for target in targets
+                   for entry in (target.values() if key == "*" else [target[key]])]
+    for target in targets:
+        for key in (list(target) if keys[-1] == "*" else [keys[-1]]):
+            if key not in target:
+                raise SimulationError(f"{path}: no key {key!r}")
+            target[key] = value
+
+
+def combinations(sweep, module):
+    """(runtime parameters, table overrides) for every combination of the sweep."""
+    runtime = set(protocol_parameters(module))
+    for name in sweep:
+        if not table_paths(name) and name not in runtime:
+            raise SystemExit(f"unknown setting {name!r}: not a runtime parameter, "
+                             f"a named setting ({', '.join(SETTINGS)}) or a TABLE.key path")
+    names = list(sweep)
+    for values in itertools.product(*(sweep[name] for name in names)):
+        combination = OrderedDict(zip(names, values))
+        # runtime parameters go in as text, so protocol_parameters converts them to the declared
+        # type (a str choice such as wash_tips stays "200", not 200)
+        params = {name: str(value) for name, value in combination.items() if not table_paths(name)}
+        try:
+            protocol_parameters(module, params)
+        except ValueError as error:
+            raise SystemExit(f"bad sweep value in {dict(combination)}: {error}")
+        overrides = [(path, value) for name, value in combination.items()
+                     for path in table_paths(name)]
+        yield combination, params, overrides
+# endregion
+
+
+# region evaluation
+##################################################################################
+def tip_reserve(commands):
+    """Smallest uL held in a tip after its last dispense into the 384 plate."""
+    reserve = None
+    held = 0.0
+    after_dest = None
+    for command in commands:
+        if command.kind == "pick_up_tip":
+            held, after_dest = 0.0, None
+        elif command.kind in ("aspirate", "air_gap"):
+            held += command.volume
+        elif command.kind == "dispense":
+            held -= command.volume
+            if command.load_name == DEST_LOAD_NAME:
+                after_dest = held
+        elif command.kind in ("drop_tip", "return_tip") and after_dest is not None:
+            reserve = after_dest if reserve is None else min(reserve, after_dest)
+    return reserve
+
+
+def below_bottom(commands):
+    """First command that goes below a well bottom, as text, or None."""
+    for command in commands:
+        if command.load_name and command.z < 0:
+            return f"{command.kind} at {command.z:g} mm in {command.well} of {command.labware}"
+    return None
+
+
+def evaluate(task):
+    """Metrics of one combination; runs in a worker process."""
+    path, params, overrides = task
+    try:
+        module = load_protocol(path)
+        for override, value in overrides:
+            apply_override(module, override, value)
+        context = record_protocol(path, params, module=module)
+    except Exception as error:  # a failed combination is a result, not a crash of the sweep
+        return {"error": f"{type(error).__name__}: {error}"}
+    metrics = scenario_metrics(context.commands, context.model)
+    return {
+        "error": None,
+        "seconds": metrics["seconds"],
+        "tips": sum(metrics["tips"].values()),
+        "drawn_ul": round(sum(metrics["volume_ul"].values()), 1),
+        "reserve_ul": tip_reserve(context.commands),
+        "below_bottom": below_bottom(context.commands),
+    }
+
+
+def run_sweep(sweep, path=DEFAULT_PROTOCOL, params=None, jobs=None):
+    """One result per combination: the settings, their run parameters and metrics."""
+    module = load_protocol(path)
+    base = dict(COMMON_PARAMS, **(params or {}))
+    entries = list(combinations(sweep, module))
+    tasks = [(path, dict(base, **run_params), overrides) for _, run_params, overrides in entries]
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        chunk = max(1, len(tasks) // (4 * (jobs or os.cpu_count() or 1)))
+        metrics = list(pool.map(evaluate, tasks, chunksize=chunk))
+    return [dict(settings=combination, **result) for (combination, _, _), result in zip(entries, metrics)]
+# endregion
+
+
+# region pareto
+##################################################################################
+def unsafe_reason(result, min_reserve=DEFAULT_MIN_RESERVE):
+    """Why a result is not safe, None when it is."""
+    if result["error"]:
+        return result["error"]
+    if result["below_bottom"]:
+        return "below the well bottom: " + result["below_bottom"]
+    if result["reserve_ul"] is not None and result["reserve_ul"] < min_reserve - 1e-6:
+        return f"only {result['reserve_ul']:g} uL left in a tip (minimum {min_reserve:g})"
+    return None
+
+
+def dominates(a, b):
+    return (all(a[key] <= b[key] for key in OBJECTIVES)
+            and any(a[key] < b[key] for key in OBJECTIVES))
+
+
+def pareto_front(results):
+    """Results no other result beats on every objective, fastest first."""
+    front = [result for result in results
+             if not any(dominates(other, result) for other in results)]
+    return sorted(front, key=lambda result: tuple(result[key] for key in OBJECTIVES))
+# endregion
+
+
+# region cli
+##################################################################################
+def format_settings(settings):
+    return ", ".join(f"{name}={value}" for name, value in settings.items())
+
+
+def format_report(results, min_reserve, reference=None):
+    safe = [result for result in results if not unsafe_reason(result, min_reserve)]
+    unsafe = [result for result in results if unsafe_reason(result, min_reserve)]
+    lines = [f"{len(results)} combinations, {len(safe)} safe, {len(unsafe)} rejected"]
+    if reference:
+        lines.append(f"defaults: {reference['seconds'] / 60:.1f} min, {reference['tips']} tips, "
+                     f"{reference['drawn_ul'] / 1000:.1f} ml drawn")
+    lines.append("")
+    lines.append("Pareto-optimal safe settings:")
+    lines.append(f"  {'minutes':>8}{'tips':>6}{'drawn ml':>10}{'reserve':>9}  settings")
+    for result in pareto_front(safe):
+        reserve = "-" if result["reserve_ul"] is None else f"{result['reserve_ul']:g}"
+        lines.append(f"  {result['seconds'] / 60:8.1f}{result['tips']:6d}{result['drawn_ul'] / 1000:10.2f}"
+                     f"{reserve:>9}  {format_settings(result['settings'])}")
+    if unsafe:
+        lines.append("")
+        lines.append("Rejected:")
+        for result in unsafe:
+            lines.append(f"  {format_settings(result['settings'])}: {unsafe_reason(result, min_reserve)}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("protocol", nargs="?", default=DEFAULT_PROTOCOL)
+    parser.add_argument("--sweep", action="append", metavar="NAME=VALUES", required=True,
+                        help="setting and its values, a,b,c or start:stop:step (repeatable)")
+    parser.add_argument("--param", action="append", metavar="NAME=VALUE",
+                        help="fixed runtime parameter for every run (repeatable)")
+    parser.add_argument("--jobs", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--min-reserve", type=float, default=DEFAULT_MIN_RESERVE,
+                        help="uL that must stay in a tip after its last dispense (default 2)")
+    parser.add_argument("--json", action="store_true", help="print every result as JSON")
+    args = parser.parse_args(argv)
+
+    params = parse_params(args.param)
+    results = run_sweep(parse_sweep(args.sweep), args.protocol, params, args.jobs)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return 0
+    reference = evaluate((args.protocol, dict(COMMON_PARAMS, **params), []))
+    print(format_report(results, args.min_reserve, None if reference["error"] else reference))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
+# endregion
@@ -0,0 +1,1022 @@
+"""Offline wall-clock estimate for the LEGENDPLEX protocol.
+
+Runs ``run()`` from the protocol file against a recording ProtocolContext
+(no robot and no Opentrons simulator needed) and turns every recorded
+command into an estimated duration. Gantry travel is taken from the Flex
+deck slot positions, liquid handling from flow rate x rate x volume and
+touch-tips from the path around the well at the requested speed.
+
+The numbers are a planning model, not a measurement. The constants in
+``TimingModel`` are deliberately easy to tune against a stopwatch run.
+
+Usage:
+    python legendplex_timing.py
+    python legendplex_timing.py LEGENDPLEX_Human_CD8_NK_Final_Protocol.py --json
+    python legendplex_timing.py --param name=value
+    python legendplex_timing.py --liquid-report
+    python legendplex_timing.py --bead-report --param incubation=pause
+    python legendplex_timing.py --wash-plan --param wash_tips=1000
+    python legendplex_timing.py --tip-plan --param sample_map=my_map.csv
+"""
+
+import argparse
+import csv
+import importlib.util
+import json
+import math
+import os
+import re
+import sys
+from collections import OrderedDict
+from dataclasses import dataclass, field, asdict
+from types import SimpleNamespace
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_PROTOCOL = os.path.join(HERE, "LEGENDPLEX_Human_CD8_NK_Final_Protocol.py")
+
+# Flex deck: front-left corner of each slot (ot3_standard deck definition, mm)
+SLOT_ORIGINS = {
+    "D1": (0.0, 0.0), "D2": (164.0, 0.0), "D3": (328.0, 0.0),
+    "C1": (0.0, 107.0), "C2": (164.0, 107.0), "C3": (328.0, 107.0),
+    "B1": (0.0, 214.0), "B2": (164.0, 214.0), "B3": (328.0, 214.0),
+    "A1": (0.0, 321.0), "A2": (164.0, 321.0), "A3": (328.0, 321.0),
+}
+SLOT_SIZE = (128.0, 86.0)
+
+AGILENT_384_JSON = os.path.join(HERE, "Agilent_384_Well_Plate.json")
+
+# load name -> rows, columns, A1 x, A1 y, pitch, well x size, well y size, depth
+LABWARE_GEOMETRY = {
+    "agilent_384_wellplate_140ul": (16, 24, 12.12, 76.5, 4.5, 3.63, 3.63, 11.43),
+    "corning_96_wellplate_360ul_flat": (8, 12, 14.38, 74.24, 9.0, 6.86, 6.86, 10.67),
+    "nest_12_reservoir_15ml": (1, 12, 14.38, 42.78, 9.0, 8.2, 71.2, 39.55),
+    "nest_1_reservoir_195ml": (1, 1, 63.88, 42.74, 9.0, 106.8, 71.2, 25.0),
+}
+TIPRACK_GEOMETRY = (8, 12, 14.38, 74.38, 9.0, 5.6, 5.6, 97.0)
+
+
+
+def labware_geometry_from_json(path):
+    """Geometry tuple (as in LABWARE_GEOMETRY) from a labware definition file."""
+    with open(path) as handle:
+        definition = json.load(handle)
+    ordering = definition["ordering"]
+    a1, a2 = (definition["wells"][name] for name in ("A1", ordering[1][0]))
+    return (len(ordering[0]), len(ordering), a1["x"], a1["y"], round(a2["x"] - a1["x"], 3),
+            a1.get("xDimension", a1.get("diameter", 0.0)),
+            a1.get("yDimension", a1.get("diameter", 0.0)), a1["depth"])
+
+
+if os.path.exists(AGILENT_384_JSON):
+    LABWARE_GEOMETRY["agilent_384_wellplate_140ul"] = labware_geometry_from_json(AGILENT_384_JSON)
+
+# 96-channel default flow rates in uL/s, as the simulator reports them at API 2.22
+DEFAULT_FLOW_RATES = {"aspirate": 160.0, "dispense": 160.0, "blow_out": 80.0}
+
+STEP_COMMENT = re.compile(r"^\s*STEP\s+(\d+)", re.IGNORECASE)
+
+
+class SimulationError(Exception):
+    """Raised when the recorded protocol does something the robot would reject."""
+
+
+@dataclass
+class TimingModel:
+    """Tunable constants for the duration estimate (mm, mm/s and seconds)."""
+
+    xy_speed: float = 300.0
+    z_speed: float = 35.0
+    arc_height: float = 60.0
+    short_arc_height: float = 8.0
+    move_overhead: float = 0.3
+    liquid_overhead: float = 0.2
+    pick_up_full: float = 8.0
+    pick_up_partial: float = 4.0
+    drop_full: float = 5.0
+    drop_partial: float = 2.5
+    blow_out: float = 1.0
+    configure_nozzles: float = 0.5
+    touch_point: float = 0.35
+    latch: float = 2.0
+    shake_ramp: float = 5.0
+    shake_stop: float = 5.0
+
+
+@dataclass
+class Command:
+    """One recorded protocol command."""
+
+    kind: str
+    step: str
+    labware: str = ""
+    load_name: str = ""
+    slot: str = ""
+    well: str = ""
+    x: float = 0.0
+    y: float = 0.0
+    z: float = 0.0
+    volume: float = 0.0
+    flow_rate: float = 0.0
+    channels: int = 0
+    repetitions: int = 0
+    seconds: float = 0.0
+    speed: float = 0.0
+    radius: float = 0.0
+    tip_rack: str = ""
+    message: str = ""
+
+
+# region recording context
+##################################################################################
+class Location:
+    """A point in a well, relative to its bottom or top."""
+
+    def __init__(self, well, reference, z):
+        self.well = well
+        self.reference = reference
+        self.z = z
+
+    @property
+    def labware(self):
+        return self.well
+
+    def absolute_z(self):
+        if self.reference == "top":
+            return self.well.depth + self.z
+        return self.z
+
+
+class RecordedWell:
+    def __init__(self, labware, name, x, y, x_size, y_size, depth):
+        self.parent = labware
+        self.well_name = name
+        self.x = x
+        self.y = y
+        self.x_size = x_size
+        self.y_size = y_size
+        self.depth = depth
+
+    def top(self, z=0.0):
+        return Location(self, "top", z)
+
+    def bottom(self, z=0.0):
+        return Location(self, "bottom", z)
+
+    def center(self):
+        return Location(self, "bottom", self.depth / 2)
+
+    def __str__(self):
+        return f"{self.well_name} of {self.parent}"
+
+    __repr__ = __str__
+
+
+class RecordedLabware:
+    def __init__(self, load_name, slot, label=None, adapter=None):
+        self.load_name = load_name
+        self.slot = slot
+        self.label = label or load_name
+        self.adapter = adapter
+        self.is_tiprack = "tiprack" in load_name
+        self.tip_volume = _tip_volume(load_name) if self.is_tiprack else 0.0
+        geometry = TIPRACK_GEOMETRY if self.is_tiprack else LABWARE_GEOMETRY.get(
+            load_name, (8, 12, 14.38, 74.24, 9.0, 6.86, 6.86, 10.67)
+        )
+        rows, columns, x0, y0, pitch, x_size, y_size, depth = geometry
+        self.row_count = rows
+        self.column_count = columns
+        origin = SLOT_ORIGINS.get(slot, (0.0, 0.0))
+        self._wells = OrderedDict()
+        for c in range(columns):
+            for r in range(rows):
+                name = f"{chr(ord('A') + r)}{c + 1}"
+                self._wells[name] = RecordedWell(
+                    self, name, origin[0] + x0 + c * pitch, origin[1] + y0 - r * pitch,
+                    x_size, y_size, depth,
+                )
+        # tip columns already taken from this rack (tip racks only)
+        self.used_columns = set()
+        # single tips taken from otherwise full columns
+        self.used_wells = set()
+
+    def __getitem__(self, name):
+        return self._wells[name]
+
+    def reset(self):
+        """Mark every tip of the rack as present again (a fresh rack was placed)."""
+        self.used_columns.clear()
+        self.used_wells.clear()
+
+    def taken_columns(self):
+        """Columns that are not full any more, either picked whole or missing single tips."""
+        return self.used_columns | {int(name[1:]) for name in self.used_wells}
+
+    def wells(self):
+        return list(self._wells.values())
+
+    def wells_by_name(self):
+        return dict(self._wells)
+
+    def columns(self):
+        return [
+            [self._wells[f"{chr(ord('A') + r)}{c + 1}"] for r in range(self.row_count)]
+            for c in range(self.column_count)
+        ]
+
+    def __str__(self):
+        return f"{self.label} on slot {self.slot}"
+
+    __repr__ = __str__
+
+
+class RecordedTrash:
+    def __init__(self, slot):
+        self.slot = slot
+        origin = SLOT_ORIGINS.get(slot, (0.0, 0.0))
+        self.x = origin[0] + SLOT_SIZE[0] / 2
+        self.y = origin[1] + SLOT_SIZE[1] / 2
+
+    def __str__(self):
+        return f"Trash Bin on slot {self.slot}"
+
+
+class RecordedAdapter:
+    """An adapter on a module; labware loaded onto it sits in the module's slot."""
+
+    def __init__(self, context, load_name, slot):
+        self.context = context
+        self.load_name = load_name
+        self.slot = slot
+
+    def load_labware(self, load_name, label=None, **kwargs):
+        return self.context.load_labware(load_name, self.slot, label=label, adapter=self.load_name)
+
+
+class RecordedHeaterShaker:
+    """Heater-Shaker latch and shake commands (temperatures are not used)."""
+
+    def __init__(self, context, slot):
+        self.context = context
+        self.slot = slot
+
+    def load_adapter(self, load_name):
+        return RecordedAdapter(self.context, load_name, self.slot)
+
+    def _record(self, message, seconds):
+        self.context.record("module", seconds=seconds, message=message)
+
+    def close_labware_latch(self):
+        self._record("close latch", self.context.model.latch)
+
+    def open_labware_latch(self):
+        self._record("open latch", self.context.model.latch)
+
+    def set_and_wait_for_shake_speed(self, rpm):
+        self._record(f"shake at {rpm} rpm", self.context.model.shake_ramp)
+
+    def deactivate_shaker(self):
+        self._record("stop shaking", self.context.model.shake_stop)
+
+
+class RecordedPipette:
+    def __init__(self, context, name, mount, tip_racks=None):
+        self._context = context
+        self.name = name
+        self.mount = mount
+        self.tip_racks = list(tip_racks or [])
+        self.flow_rate = SimpleNamespace(**DEFAULT_FLOW_RATES)
+        self.nozzle_style = "ALL"
+        self.nozzle_start = "A1"
+        self.has_tip = False
+        self.current_volume = 0.0
+        self.tip_volume = 0.0
+        self.tip_rack = None
+        self._picked = set()
+        self._last_well = None
+
+    @property
+    def channels(self):
+        if self.nozzle_style == "ALL":
+            return 96
+        return 1 if self.nozzle_style == "SINGLE" else 8
+
+    @property
+    def active_channels(self):
+        return self.channels
+
+    # nozzle layout / tips
+    def configure_nozzle_layout(self, style, start=None, tip_racks=None, **kwargs):
+        self.nozzle_style = getattr(style, "name", str(style)).upper()
+        self.nozzle_start = start or "A1"
+        if tip_racks is not None:
+            self.tip_racks = list(tip_racks)
+        self._record("configure_nozzle_layout", seconds=self._context.model.configure_nozzles)
+
+    def reset_tipracks(self):
+        for rack in self.tip_racks:
+            rack.reset()
+
+    def pick_up_tip(self, location=None):
+        if self.has_tip:
+            raise SimulationError(f"{self.name} already has a tip attached")
+        if self.nozzle_style == "SINGLE":
+            self._pick_single(location)
+            return
+        rack, column = self._next_tips(location)
+        columns = set(range(1, 13)) if self.nozzle_style == "ALL" else {column}
+        if columns & rack.taken_columns():
+            raise SimulationError(f"tips in column(s) {sorted(columns & rack.taken_columns())} of {rack} "
+                                  f"were already used")
+        rack.used_columns.update(columns)
+        self._picked = columns
+        self._attach(rack, rack[f"A{column}"])
+
+    def _pick_single(self, location):
+        if location is not None:
+            well = getattr(location, "well", location)
+            rack, name = well.parent, well.well_name
+        else:
+            rack, name = next(
+                ((rack, well.well_name) for rack in self.tip_racks for column in reversed(rack.columns())
+                 for well in column if well.well_name not in rack.used_wells
+                 and int(well.well_name[1:]) not in rack.used_columns),
+                (None, None),
+            )
+            if rack is None:
+                raise SimulationError(f"out of tips for SINGLE pickup in {[str(r) for r in self.tip_racks]}")
+        if name in rack.used_wells or int(name[1:]) in rack.used_columns:
+            raise SimulationError(f"tip {name} of {rack} was already used")
+        rack.used_wells.add(name)
+        self._picked = set()
+        self._attach(rack, rack[name])
+
+    def _attach(self, rack, well):
+        self.has_tip = True
+        self.tip_volume = rack.tip_volume
+        self.tip_rack = rack
+        self.current_volume = 0.0
+        self._record("pick_up_tip", well=well, tip_rack=str(rack))
+
+    def _next_tips(self, location):
+        if location is not None:
+            well = getattr(location, "well", location)
+            return well.parent, int(well.well_name[1:])
+        for rack in self.tip_racks:
+            free = [c for c in range(1, 13) if c not in rack.taken_columns()]
+            if self.nozzle_style == "ALL":
+                if len(free) == 12:
+                    return rack, 1
+                continue
+            if free:
+                # start A1 picks from the right of the rack, start A12 from the left
+                return rack, (max(free) if self.nozzle_start == "A1" else min(free))
+        raise SimulationError(
+            f"out of tips for {self.nozzle_style} pickup in {[str(r) for r in self.tip_racks]}"
+        )
+
+    def drop_tip(self, location=None):
+        self._require_tip("drop_tip")
+        trash = location if isinstance(location, RecordedTrash) else self._context.trash
+        self._detach()
+        self._record("drop_tip", trash=trash)
+
+    def return_tip(self):
+        self._require_tip("return_tip")
+        if self.nozzle_style != "ALL":
+            # as on the robot, partial tips cannot go back into a rack
+            raise SimulationError(f"{self.name} cannot return tips with a {self.nozzle_style} layout")
+        rack = self.tip_rack
+        # the tips go back where they came from and can be picked up again
+        rack.used_columns.difference_update(self._picked)
+        self._detach()
+        self._record("return_tip", well=rack["A1"], tip_rack=str(rack))
+
+    def _detach(self):
+        self.has_tip = False
+        self.current_volume = 0.0
+
+    # liquid handling
+    def aspirate(self, volume=None, location=None, rate=1.0):
+        self._require_tip("aspirate")
+        volume = float(self.tip_volume - self.current_volume if volume is None else volume)
+        if self.current_volume + volume > self.tip_volume + 1e-6:
+            raise SimulationError(
+                f"aspirating {volume} uL exceeds the {self.tip_volume:g} uL tip "
+                f"({self.current_volume:g} uL already held)"
+            )
+        self.current_volume += volume
+        self._record("aspirate", location, volume=volume,
+                     flow_rate=self.flow_rate.aspirate * rate)
+
+    def dispense(self, volume=None, location=None, rate=1.0, **kwargs):
+        self._require_tip("dispense")
+        volume = float(self.current_volume if volume is None else volume)
+        if volume > self.current_volume + 1e-6:
+            raise SimulationError(
+                f"dispensing {volume} uL but only {self.current_volume:g} uL is in the tip"
+            )
+        self.current_volume -= volume
+        self._record("dispense", location, volume=volume,
+                     flow_rate=self.flow_rate.dispense * rate)
+
+    def mix(self, repetitions=1, volume=None, location=None, rate=1.0):
+        self._require_tip("mix")
+        volume = float(self.tip_volume if volume is None else volume)
+        if self.current_volume + volume > self.tip_volume + 1e-6:
+            raise SimulationError(f"mixing {volume} uL exceeds the {self.tip_volume:g} uL tip")
+        self._record("mix", location, volume=volume, repetitions=repetitions,
+                     flow_rate=self.flow_rate.aspirate * rate)
+
+    def air_gap(self, volume=None, height=None):
+        self._require_tip("air_gap")
+        if self._last_well is None:
+            raise SimulationError("air_gap without a previous location")
+        volume = float(volume or 0.0)
+        if self.current_volume + volume > self.tip_volume + 1e-6:
+            raise SimulationError(f"air gap of {volume} uL exceeds the {self.tip_volume:g} uL tip")
+        self.current_volume += volume
+        self._record("air_gap", self._last_well.top(height or 5.0), volume=volume,
+                     flow_rate=self.flow_rate.aspirate)
+
+    def blow_out(self, location=None):
+        self._require_tip("blow_out")
+        self.current_volume = 0.0
+        if isinstance(location, RecordedTrash):
+            self._record("blow_out", trash=location)
+        else:
+            self._record("blow_out", location)
+
+    def touch_tip(self, location=None, radius=1.0, v_offset=-1.0, speed=60.0):
+        self._require_tip("touch_tip")
+        well = getattr(location, "well", location) or self._last_well
+        if well is None:
+            raise SimulationError("touch_tip without a location and no previous well")
+        self._record("touch_tip", well.top(v_offset), speed=speed, radius=radius)
+
+    def move_to(self, location, **kwargs):
+        self._record("move_to", location)
+
+    def _require_tip(self, action):
+        if not self.has_tip:
+            raise SimulationError(f"{action} without a tip attached")
+
+    def _record(self, kind, location=None, well=None, trash=None, **values):
+        if location is not None and not isinstance(location, Location):
+            location = location.bottom(1.0)
+        if location is not None:
+            well = location.well
+            values.setdefault("z", location.absolute_z())
+        if well is not None:
+            self._last_well = well
+            values.update(labware=str(well.parent), load_name=well.parent.load_name,
+                          slot=well.parent.slot,
+                          well=well.well_name, x=well.x, y=well.y)
+        elif trash is not None:
+            values.update(labware=str(trash), slot=trash.slot, x=trash.x, y=trash.y)
+        values.setdefault("channels", self.channels)
+        self._context.record(kind, **values)
+
+
+class RecordedCSV:
+    """Stands in for a CSV runtime parameter value."""
+
+    def __init__(self, contents):
+        self.contents = contents
+
+    @classmethod
+    def from_path(cls, path):
+        with open(path, newline="") as handle:
+            return cls(handle.read())
+
+    def parse_as_csv(self, detect_dialect=True, **kwargs):
+        return [row for row in csv.reader(self.contents.splitlines(), **kwargs)]
+
+
+class ParameterRecorder:
+    """Stands in for ParameterContext inside ``add_parameters``."""
+
+    def __init__(self):
+        self.definitions = OrderedDict()
+
+    def _add(self, kind, display_name, variable_name, default=None, **kwargs):
+        # same limits the robot enforces when it analyses the protocol
+        if len(display_name) > 30:
+            raise SimulationError(f"display name {display_name!r} is longer than 30 characters")
+        if len(kwargs.get("description") or "") > 100:
+            raise SimulationError(f"description of {variable_name!r} is longer than 100 characters")
+        for choice in kwargs.get("choices") or []:
+            if len(choice["display_name"]) > 30:
+                raise SimulationError(f"choice {choice['display_name']!r} is longer than 30 characters")
+        if variable_name in self.definitions:
+            raise SimulationError(f"runtime parameter {variable_name!r} is defined twice")
+        self.definitions[variable_name] = dict(kind=kind, default=default, **kwargs)
+
+    def add_int(self, display_name, variable_name, default, **kwargs):
+        self._add("int", display_name, variable_name, default, **kwargs)
+
+    def add_float(self, display_name, variable_name, default, **kwargs):
+        self._add("float", display_name, variable_name, default, **kwargs)
+
+    def add_bool(self, display_name, variable_name, default, **kwargs):
+        self._add("bool", display_name, variable_name, default, **kwargs)
+
+    def add_str(self, display_name, variable_name, default, **kwargs):
+        self._add("str", display_name, variable_name, default, **kwargs)
+
+    def add_csv_file(self, display_name, variable_name, **kwargs):
+        self._add("csv", display_name, variable_name, None, **kwargs)
+
+    def values(self, overrides=None):
+        values = {name: d["default"] for name, d in self.definitions.items()}
+        for name, value in (overrides or {}).items():
+            if name not in self.definitions:
+                raise SimulationError(f"unknown runtime parameter {name!r}")
+            values[name] = _coerce(self.definitions[name]["kind"], value)
+        return values
+
+
+class RecordingProtocolContext:
+    """Enough of ProtocolContext to run this protocol and record what it does."""
+
+    def __init__(self, params=None, model=None):
+        self.params = SimpleNamespace(**(params or {}))
+        self.model = model or TimingModel()
+        self.commands = []
+        self.labware = []
+        self.trash = None
+        self.current_step = "setup"
+
+    def is_simulating(self):
+        return True
+
+    def record(self, kind, **values):
+        command = Command(kind=kind, step=self.current_step, **values)
+        self.commands.append(command)
+        return command
+
+    def load_labware(self, load_name, location, label=None, adapter=None, **kwargs):
+        labware = RecordedLabware(load_name, str(location), label, adapter)
+        self.labware.append(labware)
+        return labware
+
+    def load_trash_bin(self, location):
+        self.trash = RecordedTrash(str(location))
+        return self.trash
+
+    def load_module(self, module_name, location=None, **kwargs):
+        if not module_name.startswith("heaterShaker"):
+            raise SimulationError(f"module {module_name} is not supported by the recorder")
+        return RecordedHeaterShaker(self, str(location))
+
+    def load_instrument(self, instrument_name, mount, tip_racks=None, **kwargs):
+        return RecordedPipette(self, instrument_name, mount, tip_racks)
+
+    def comment(self, msg):
+        match = STEP_COMMENT.match(str(msg))
+        if match:
+            self.current_step = f"step {match.group(1)}"
+        self.record("comment", message=str(msg))
+
+    def pause(self, msg=None):
+        self.record("pause", message=str(msg or ""))
+
+    def delay(self, seconds=0, minutes=0, msg=None):
+        self.record("delay", seconds=float(seconds) + 60.0 * float(minutes),
+                    message=str(msg or ""))
+# endregion
+
+
+# region estimate
+##################################################################################
+@dataclass
+class Estimate:
+    total: float = 0.0
+    pauses: int = 0
+    per_step: dict = field(default_factory=OrderedDict)
+    per_kind: dict = field(default_factory=OrderedDict)
+    per_step_kind: dict = field(default_factory=OrderedDict)
+    timeline: list = field(default_factory=list)
+
+    def as_dict(self):
+        data = asdict(self)
+        data["timeline"] = [
+            dict(asdict(command), start=start, duration=duration)
+            for command, start, duration in self.timeline
+        ]
+        return data
+
+
+def travel_seconds(model, start, end, same_labware):
+    """Gantry time between two deck points (x, y, z), arcing over the deck."""
+    if start is None:
+        return 0.0
+    xy = math.hypot(end[0] - start[0], end[1] - start[1])
+    if xy < 1e-6 and abs(end[2] - start[2]) < 1e-6:
+        return 0.0
+    arc = model.short_arc_height if same_labware else model.arc_height
+    z = max(arc - start[2], 0.0) + max(arc - end[2], 0.0)
+    return model.move_overhead + xy / model.xy_speed + z / model.z_speed
+
+
+def liquid_seconds(model, volume, flow_rate):
+    if volume <= 0 or flow_rate <= 0:
+        return 0.0
+    return model.liquid_overhead + volume / flow_rate
+
+
+def touch_tip_seconds(model, command):
+    # four points around the well: +x, -x, +y, -y starting from the centre,
+    # each one a separate move that has to accelerate and settle
+    half_width = _touch_half_width(command)
+    path = (5.0 + math.sqrt(2.0)) * half_width * command.radius
+    return 4 * model.touch_point + path / max(command.speed, 1e-6)
+
+
+def command_seconds(model, command):
+    """Duration of the command itself, excluding travel to reach it."""
+    kind = command.kind
+    if kind in ("aspirate", "dispense", "air_gap"):
+        return liquid_seconds(model, command.volume, command.flow_rate)
+    if kind == "mix":
+        return command.repetitions * 2 * liquid_seconds(model, command.volume, command.flow_rate)
+    if kind == "touch_tip":
+        return touch_tip_seconds(model, command)
+    if kind == "pick_up_tip":
+        return model.pick_up_full if command.channels == 96 else model.pick_up_partial
+    if kind in ("drop_tip", "return_tip"):
+        return model.drop_full if command.channels == 96 else model.drop_partial
+    if kind == "blow_out":
+        return model.blow_out
+    if kind == "delay":
+        return command.seconds
+    if kind in ("configure_nozzle_layout", "module"):
+        return command.seconds
+    return 0.0
+
+
+def estimate(commands, model=None):
+    """Walk the recorded commands in order and attribute time to each one."""
+    model = model or TimingModel()
+    result = Estimate()
+    position = None
+    last_labware = None
+    clock = 0.0
+    for command in commands:
+        duration = 0.0
+        if command.slot:
+            target = (command.x, command.y, command.z)
+            duration += travel_seconds(model, position, target, command.labware == last_labware)
+            position = target
+            last_labware = command.labware
+        duration += command_seconds(model, command)
+        if command.kind == "pause":
+            result.pauses += 1
+        result.timeline.append((command, clock, duration))
+        clock += duration
+        result.per_step[command.step] = result.per_step.get(command.step, 0.0) + duration
+        counts = result.per_kind.setdefault(command.kind, {"count": 0, "seconds": 0.0})
+        counts["count"] += 1
+        counts["seconds"] += duration
+        by_kind = result.per_step_kind.setdefault(command.step, OrderedDict())
+        by_kind[command.kind] = by_kind.get(command.kind, 0.0) + duration
+    result.total = clock
+    return result
+# endregion
+
+
+# region bead suspension
+##################################################################################
+BEAD_PLAN_COMMENT = "Bead mixing:"
+
+
+@dataclass
+class BeadModel:
+    """Planning model of bead settling in the reservoir (seconds, fractions).
+
+    The gradient runs from 0 (freshly mixed) to 1 (settled). Standing still
+    moves it towards 1 with time constant ``settle_seconds``. Every mix cycle
+    removes ``mix_efficiency`` of what is left. A dose drawn near the bottom
+    carries ``1 + enrichment x gradient`` times the mixed bead concentration.
+    Tune the constants against bead counts from a run.
+    """
+
+    settle_seconds: float = 300.0
+    enrichment: float = 0.5
+    mix_efficiency: float = 0.5
+
+
+def bead_passes(result, bead_model=None):
+    """Mix cycles and relative bead concentration of every dose, per bead pass.
+
+    A bead pass starts at the protocol's bead mixing comment; its doses are the
+    aspirates from the well of its first mix or aspirate, within the same step.
+    The reservoir is taken as settled when the pass starts.
+    """
+    bead_model = bead_model or BeadModel()
+    passes = []
+    for command, start, duration in result.timeline:
+        if command.kind == "comment" and command.message.startswith(BEAD_PLAN_COMMENT):
+            passes.append({"mix_cycles": 0, "doses": []})
+            source, step, gradient, clock = None, command.step, 1.0, start
+            continue
+        if not passes or command.step != step or command.kind not in ("mix", "aspirate"):
+            continue
+        if source is None:
+            source = (command.labware, command.well)
+        if (command.labware, command.well) != source:
+            continue
+        gradient = 1.0 - (1.0 - gradient) * math.exp(-(start - clock) / bead_model.settle_seconds)
+        clock = start
+        if command.kind == "mix":
+            gradient *= (1.0 - bead_model.mix_efficiency) ** command.repetitions
+            passes[-1]["mix_cycles"] += command.repetitions
+        else:
+            passes[-1]["doses"].append(1.0 + bead_model.enrichment * gradient)
+    return passes
+
+
+def bead_cv(passes):
+    """Worst coefficient of variation (%) of the bead doses over the bead passes."""
+    worst = 0.0
+    for bead_pass in passes:
+        doses = bead_pass["doses"]
+        if len(doses) > 1:
+            mean = sum(doses) / len(doses)
+            spread = math.sqrt(sum((dose - mean) ** 2 for dose in doses) / len(doses))
+            worst = max(worst, 100.0 * spread / mean)
+    return worst
+# endregion
+
+
+# region protocol loading
+##################################################################################
+def load_protocol(path=DEFAULT_PROTOCOL):
+    """Import the protocol file as a module without running it."""
+    spec = importlib.util.spec_from_file_location("legendplex_protocol", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def protocol_parameters(module, overrides=None):
+    """Defaults from ``add_parameters`` (if the protocol has any) plus overrides."""
+    recorder = ParameterRecorder()
+    if hasattr(module, "add_parameters"):
+        module.add_parameters(recorder)
+    return recorder.values(overrides)
+
+
+def record_protocol(path=DEFAULT_PROTOCOL, params=None, model=None, module=None):
+    """Run the protocol against a RecordingProtocolContext and return the context."""
+    module = module or load_protocol(path)
+    context = RecordingProtocolContext(protocol_parameters(module, params), model)
+    module.run(context)
+    return context
+
+
+def plate_layout(module, values):
+    """The protocol's PlateLayout for the sample map in ``values``, without running it."""
+    dest = RecordingProtocolContext(values).load_labware("agilent_384_wellplate_140ul", "D1")
+    return module.PlateLayout(
+        module.read_sample_map(values["sample_map"]),
+        [[well.well_name for well in column] for column in dest.columns()],
+    )
+# endregion
+
+
+# region helpers / cli
+##################################################################################
+def _tip_volume(load_name):
+    match = re.search(r"_(\d+)ul", load_name)
+    return float(match.group(1)) if match else 0.0
+
+
+def _touch_half_width(command):
+    geometry = LABWARE_GEOMETRY.get(command.load_name, TIPRACK_GEOMETRY)
+    return geometry[5] / 2
+
+
+def _coerce(kind, value):
+    if kind == "csv" and isinstance(value, str):
+        return RecordedCSV.from_path(value)
+    if not isinstance(value, str):
+        return value
+    if kind == "int":
+        return int(value)
+    if kind == "float":
+        return float(value)
+    if kind == "bool":
+        return value.strip().lower() in ("1", "true", "yes", "on")
+    return value
+
+
+def parse_params(pairs):
+    params = {}
+    for pair in pairs or []:
+        name, sep, value = pair.partition("=")
+        if not sep:
+            raise SystemExit(f"--param expects name=value, got {pair!r}")
+        params[name.strip()] = value.strip()
+    return params
+
+
+def choice_report(path, prefix, choices, reference, params=None, model=None):
+    """Seconds each choice of a per-reagent parameter adds to each reagent.
+
+    ``prefix`` names the parameters (``touch_`` -> ``touch_beads``). Returns
+    {reagent: {choice: seconds}}, each figure from a full recorded run with
+    every reagent set to ``reference`` except the one being measured.
+    """
+    module = load_protocol(path)
+    reagents = [reagent for reagent, _ in module.TOUCH_REAGENTS]
+    params = dict(params or {})
+    base = dict(params, **{prefix + reagent: reference for reagent in reagents})
+
+    def total(overrides):
+        context = record_protocol(path, overrides, model, module)
+        return estimate(context.commands, context.model).total
+
+    baseline = total(base)
+    report = OrderedDict()
+    for reagent in reagents:
+        report[reagent] = OrderedDict(
+            (choice, total(dict(base, **{prefix + reagent: choice})) - baseline)
+            for choice in choices
+        )
+    return report
+
+
+def touch_report(path=DEFAULT_PROTOCOL, params=None, model=None):
+    """Seconds each droplet removal strategy adds to each reagent, against no touching."""
+    strategies = load_protocol(path).TOUCH_STRATEGIES
+    return choice_report(path, "touch_", list(strategies), "none", params, model)
+
+
+def liquid_report(path=DEFAULT_PROTOCOL, params=None, model=None):
+    """Seconds each liquid class adds to each reagent, against the aqueous class."""
+    choices = [choice["value"] for choice in load_protocol(path).LIQUID_CLASS_CHOICES]
+    return choice_report(path, "class_", choices, "aqueous", params, model)
+
+
+def bead_report(path=DEFAULT_PROTOCOL, params=None, model=None, bead_model=None,
+                seconds=(30, 60, 90, 120, 180, 300), columns=(1, 2, 3, 4, 6, 12)):
+    """Run time, mix cycles and bead CV of every bead mixing strategy and interval."""
+    module = load_protocol(path)
+    params = dict(params or {})
+    runs = [("every", {"bead_mixing": "every"})]
+    runs += [(f"every {value} s", {"bead_mixing": "seconds", "bead_remix_seconds": value}) for value in seconds]
+    runs += [(f"every {value} column(s)", {"bead_mixing": "columns", "bead_remix_columns": value})
+             for value in columns]
+    report = OrderedDict()
+    for label, overrides in runs:
+        context = record_protocol(path, dict(params, **overrides), model, module)
+        result = estimate(context.commands, context.model)
+        passes = bead_passes(result, bead_model)
+        report[label] = {
+            "seconds": result.total,
+            "mix_cycles": sum(bead_pass["mix_cycles"] for bead_pass in passes),
+            "cv": bead_cv(passes),
+        }
+    return report
+
+
+def format_bead_report(report):
+    reference = report["every"]["seconds"]
+    lines = ["Bead mixing strategies (CV from the bead settling model)", ""]
+    lines.append(f"  {'remix':<20}{'minutes':>9}{'saved':>8}{'cycles':>8}{'CV %':>7}")
+    for label, row in report.items():
+        lines.append(f"  {label:<20}{row['seconds'] / 60:9.1f}{(reference - row['seconds']) / 60:8.1f}"
+                     f"{row['mix_cycles']:8d}{row['cv']:7.1f}")
+    return "\n".join(lines)
+
+
+def format_choice_report(report, selected, title):
+    choices = list(next(iter(report.values())))
+    lines = [title + " (* = selected)", ""]
+    lines.append(f"  {'reagent':<12}" + "".join(f"{name:>10}" for name in choices))
+    for reagent, seconds in report.items():
+        cells = []
+        for name in choices:
+            mark = "*" if selected.get(reagent) == name else " "
+            cells.append(f"{seconds[name]:9.0f}{mark}")
+        lines.append(f"  {reagent:<12}" + "".join(cells))
+    return "\n".join(lines)
+
+
+def format_wash_plans(plans):
+    """Reservoir trips of every wash, one line per trip."""
+    lines = []
+    for name, plan in plans.items():
+        lines.append(f"{name}: {len(plan['trips'])} trip(s), {plan['tip_volume']} ul tips, "
+                     f"{plan['reservoir_volume'] / 1000:.1f} ml wash buffer")
+        if plan["rinse"]:
+            lines.append(f"  rinse      aspirate {plan['rinse']:6.1f} ul, blow out")
+        for n, trip in enumerate(plan["trips"], 1):
+            rounds = sorted({cycle for cycle, _, _ in trip["dispenses"]})
+            labels = ["final" if cycle > plan["cycles"] else str(cycle) for cycle in rounds]
+            lines.append(f"  trip {n:<5} aspirate {trip['aspirate']:6.1f} ul, "
+                         f"{len(trip['dispenses'])} dispenses, rounds {', '.join(labels)}")
+    return "\n".join(lines)
+
+
+def format_tip_plan(plan):
+    """Racks, nozzle start and picked rack columns of every reagent pass."""
+    lines = [f"{len(plan['racks'])} rack(s) of 50 ul reagent tips in {', '.join(plan['racks'])}, "
+             f"{plan['tips']} tips"]
+    for reagent_pass in plan["passes"]:
+        picks = ", ".join(f"{slot}:{column}" for slot, column in reagent_pass["picks"])
+        lines.append(f"  step {reagent_pass['step']} {reagent_pass['reagent']:<10} "
+                     f"start {reagent_pass['start']:<4} {picks}")
+    for reagent, slot, neighbour in plan["clashes"]:
+        lines.append(f"  CLASH: {reagent} at {slot} hangs the head over the rack in {neighbour}")
+    return "\n".join(lines)
+
+
+def _minutes(seconds):
+    return f"{seconds / 60:8.1f} min"
+
+
+def format_report(result):
+    lines = ["Estimated robot time (operator pauses not included)", ""]
+    lines.append("By step:")
+    for step, seconds in result.per_step.items():
+        lines.append(f"  {step:<12}{_minutes(seconds)}")
+    lines.append("")
+    lines.append("By command:")
+    for kind, counts in sorted(result.per_kind.items(), key=lambda kv: -kv[1]["seconds"]):
+        lines.append(f"  {kind:<24}{counts['count']:6d} x {_minutes(counts['seconds'])}")
+    lines.append("")
+    lines.append(f"Total: {_minutes(result.total).strip()} robot time, "
+                 f"{result.pauses} operator pauses")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("protocol", nargs="?", default=DEFAULT_PROTOCOL)
+    parser.add_argument("--param", action="append", metavar="NAME=VALUE",
+                        help="override a runtime parameter (repeatable)")
+    parser.add_argument("--json", action="store_true", help="print the estimate as JSON")
+    parser.add_argument("--touch-report", action="store_true",
+                        help="compare the droplet removal strategies for every reagent")
+    parser.add_argument("--liquid-report", action="store_true",
+                        help="compare the liquid classes for every reagent")
+    parser.add_argument("--bead-report", action="store_true",
+                        help="compare bead mixing strategies by run time and bead CV")
+    parser.add_argument("--wash-plan", action="store_true",
+                        help="print the reservoir trips planned for every wash")
+    parser.add_argument("--tip-plan", action="store_true",
+                        help="print the reagent tip rack plan for the sample map")
+    args = parser.parse_args(argv)
+
+    if args.tip_plan:
+        module = load_protocol(args.protocol)
+        values = protocol_parameters(module, parse_params(args.param))
+        plan = module.plan_tips(plate_layout(module, values), values["reagent_mode"],
+                                separate_steps=values["plate_count"] > 1,
+                                standards=values["standard_prep"] == "deck")
+        print(json.dumps(plan, indent=2) if args.json else format_tip_plan(plan))
+        return 0
+
+    if args.wash_plan:
+        module = load_protocol(args.protocol)
+        values = protocol_parameters(module, parse_params(args.param))
+        plans = module.wash_plans(int(values["wash_tips"]))
+        print(json.dumps(plans, indent=2) if args.json else format_wash_plans(plans))
+        return 0
+
+    if args.bead_report:
+        report = bead_report(args.protocol, parse_params(args.param))
+        print(json.dumps(report, indent=2) if args.json else format_bead_report(report))
+        return 0
+
+    if args.touch_report or args.liquid_report:
+        params = parse_params(args.param)
+        if args.touch_report:
+            report = touch_report(args.protocol, params)
+            prefix, title = "touch_", "Seconds added by each droplet removal strategy"
+        else:
+            report = liquid_report(args.protocol, params)
+            prefix, title = "class_", "Seconds added by each liquid class, against aqueous"
+        values = protocol_parameters(load_protocol(args.protocol), params)
+        selected = {reagent: values.get(prefix + reagent) for reagent in report}
+        if args.json:
+            print(json.dumps(report, indent=2))
+        else:
+            print(format_choice_report(report, selected, title))
+        return 0
+
+    context = record_protocol(args.protocol, parse_params(args.param))
+    result = estimate(context.commands, context.model)
+    if args.json:
+        data = result.as_dict()
+        data.pop("timeline")
+        print(json.dumps(data, indent=2))
+    else:
+        print(format_report(result))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
+# endregion
@@ -0,0 +1,35 @@
+"""Shared fixtures: the repository on sys.path and the protocol module, loaded once.
+
+Run from the repository root with ``python -m pytest -q``.
+"""
+
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture(scope="session")
+def repo_root():
+    return ROOT
+
+
+@pytest.fixture(scope="session")
+def protocol():
+    """The protocol module (needs the opentrons package to import)."""
+    pytest.importorskip("opentrons")
+    from legendplex_timing import load_protocol
+    return load_protocol()
+
+
+@pytest.fixture
+def layout(protocol):
+    """PlateLayout of source columns 1.. with the given contents, the rest empty."""
+    def make(*contents):
+        sample_map = {column: "empty" for column in range(1, 13)}
+        sample_map.update({n: content for n, content in enumerate(contents, 1)})
+        return protocol.PlateLayout(sample_map)
+    return make
@@ -0,0 +1,26 @@
+"""Batch schedule: the next plate is stepped while the others incubate."""
+
+import pytest
+
+
+@pytest.mark.parametrize("plate_count", [1, 2, 4])
+def test_schedule_batch_respects_incubations(protocol, plate_count):
+    schedule = protocol.schedule_batch(plate_count)
+    assert len(schedule) == 4 * plate_count
+    # the robot runs one step at a time
+    assert all(entry["start"] >= previous["end"] for previous, entry in zip(schedule, schedule[1:]))
+    for plate in range(plate_count):
+        steps = [entry for entry in schedule if entry["plate"] == plate]
+        assert [entry["step"] for entry in steps] == [1, 2, 3, 4]
+        for previous, entry in zip(steps, steps[1:]):
+            assert entry["start"] >= previous["end"] + protocol.INCUBATION_MINUTES[previous["step"]]
+
+
+def test_schedule_batch_single_plate_runs_back_to_back(protocol):
+    schedule = protocol.schedule_batch(1)
+    assert schedule[-1]["end"] == sum(protocol.STEP_MINUTES.values()) + sum(protocol.INCUBATION_MINUTES.values())
+
+
+def test_schedule_batch_overlaps_plates(protocol):
+    one, two = (protocol.schedule_batch(count)[-1]["end"] for count in (1, 2))
+    assert two < 2 * one
@@ -0,0 +1,38 @@
+"""Bead mixing plans and the per-group time the time based remixes are placed by."""
+
+import pytest
+
+
+def test_every_group_is_mixed_by_default(protocol):
+    assert protocol.plan_bead_mixing(12, "every") == [10] * 12
+
+
+def test_remix_by_columns(protocol):
+    assert protocol.plan_bead_mixing(7, "columns", remix_columns=3) == [15, 0, 0, 3, 0, 0, 3]
+
+
+@pytest.mark.parametrize("remix_seconds, plan", [
+    (30, [15, 3, 3, 3, 3]),
+    (90, [15, 0, 0, 3, 0]),
+    (120, [15, 0, 0, 0, 3]),
+])
+def test_remix_by_time_keeps_aspirates_within_the_interval(protocol, remix_seconds, plan):
+    assert protocol.plan_bead_mixing(5, "seconds", remix_seconds, group_seconds=36) == plan
+
+
+def test_group_time_follows_touch_and_liquid_class(protocol):
+    touch, classes = protocol.TOUCH_STRATEGIES, protocol.LIQUID_CLASSES
+    every = protocol.bead_group_seconds(touch["every"], classes["standard"])
+    assert protocol.bead_group_seconds(touch["none"], classes["standard"]) < every
+    assert protocol.bead_group_seconds(touch["every"], classes["sample"]) == pytest.approx(every + 4, abs=0.5)
+
+
+def test_group_time_matches_the_estimator(protocol):
+    from legendplex_timing import DEFAULT_PROTOCOL, estimate, record_protocol
+    params = {"incubation": "pause", "bead_mixing": "every", "touch_beads": "last", "class_beads": "viscous"}
+    timeline = estimate(record_protocol(DEFAULT_PROTOCOL, params, module=protocol).commands).timeline
+    mixes = [(start, seconds) for command, start, seconds in timeline if command.kind == "mix"]
+    # one mix per group, so mix to mix is a group plus its mix
+    gaps = sorted(later - earlier - seconds for (earlier, seconds), (later, _) in zip(mixes, mixes[1:]))
+    expected = protocol.bead_group_seconds(protocol.TOUCH_STRATEGIES["last"], protocol.LIQUID_CLASSES["viscous"])
+    assert gaps[len(gaps) // 2] == pytest.approx(expected, abs=2)
@@ -0,0 +1,46 @@
+"""Benchmark regression gate: the comparison against the baseline."""
+
+from legendplex_benchmark import compare, read_baseline, write_baseline
+
+
+def metrics(seconds=100.0, pickups=10, tips=80, drawn=500.0):
+    return {"seconds": seconds, "commands": {"pick_up_tip": pickups}, "tips": {"B1": tips},
+            "volume_ul": {"reservoir": drawn}}
+
+
+BASELINE = {"full_plate": metrics()}
+
+
+def test_identical_results_have_no_changes():
+    assert compare({"full_plate": metrics()}, BASELINE) == ([], [])
+
+
+def test_rise_within_tolerance_is_a_change_only():
+    regressions, changes = compare({"full_plate": metrics(seconds=101.0)}, BASELINE, tolerance=0.02)
+    assert regressions == []
+    assert changes == [("full_plate", "seconds", 100.0, 101.0)]
+
+
+def test_rise_beyond_tolerance_is_a_regression():
+    regressions, _ = compare({"full_plate": metrics(seconds=103.0, tips=96)}, BASELINE, tolerance=0.02)
+    assert regressions == [("full_plate", "seconds", 100.0, 103.0), ("full_plate", "tips B1", 80, 96)]
+
+
+def test_improvements_never_fail():
+    regressions, changes = compare({"full_plate": metrics(seconds=50.0, pickups=5, drawn=400.0)}, BASELINE)
+    assert regressions == []
+    assert len(changes) == 3
+
+
+def test_new_metric_counts_from_zero_and_new_scenario_is_reported():
+    results = {"full_plate": dict(metrics(), tips={"B1": 80, "C1": 8}), "half_plate": metrics()}
+    regressions, changes = compare(results, BASELINE)
+    assert regressions == [("full_plate", "tips C1", 0, 8)]
+    assert ("half_plate", "(new scenario)", None, None) in changes
+
+
+def test_baseline_round_trip(tmp_path):
+    path = str(tmp_path / "baseline.json")
+    assert read_baseline(path) == {}
+    write_baseline(path, BASELINE)
+    assert read_baseline(path) == BASELINE
@@ -0,0 +1,63 @@
+"""Results workbook ingest and its cache."""
+
+import pytest
+
+pd = pytest.importorskip("pandas")
+pytest.importorskip("openpyxl")
+
+import legendplex_ingest  # noqa: E402
+from legendplex_ingest import cache_path, load, read_cache, read_workbook, write_cache  # noqa: E402
+
+
+@pytest.fixture
+def workbook(tmp_path):
+    path = str(tmp_path / "results.xlsx")
+    rows = pd.DataFrame({"Sample": ["Standard 1", "P4_2W", "PM1_x_pre", "P6_1m"],
+                         "MFI": [1000.0, 12.5, None, 8.0],
+                         "Conc": ["", "3.1", "<LLOQ", "2"]})
+    with pd.ExcelWriter(path) as writer:
+        pd.DataFrame({"Note": ["cover"]}).to_excel(writer, sheet_name="Summary", index=False)
+        for marker in ("IL-17A", "IFN-g", "Granulysin"):
+            rows.to_excel(writer, sheet_name=marker, index=False)
+    return path
+
+
+def test_read_workbook_splits_samples_like_the_r_code(workbook):
+    data = read_workbook(workbook)
+    assert list(data["Marker"].cat.categories) == ["IL-17A", "IFN-g", "Granulysin"]
+    assert len(data) == 9
+    first = data.iloc[:3]
+    assert list(first["Patient"]) == ["P4", "PM1", "P6"]
+    assert list(first["Timepoint"]) == ["2W", "PRE", "1M"]
+    assert list(first["Group"]) == ["SOC", "SOC", "Belatacept"]
+
+
+def test_npz_cache_round_trip_keeps_types(workbook, tmp_path):
+    data = read_workbook(workbook)
+    target = str(tmp_path / "cache" / "results.npz")
+    write_cache(data, target)
+    cached = read_cache(target)
+    pd.testing.assert_frame_equal(cached, data, check_dtype=False)
+    assert cached["MFI"].dtype.kind == "f"
+    # the mixed column stays text, with missing values kept missing
+    assert cached["Conc"].isna().sum() == data["Conc"].isna().sum()
+    assert list(cached["Marker"].cat.categories) == list(data["Marker"].cat.categories)
+
+
+def test_load_reads_the_cache_once_written(workbook, tmp_path, monkeypatch):
+    cache_dir = str(tmp_path / "cache")
+    first = load(workbook, cache_dir=cache_dir)
+    monkeypatch.setattr(legendplex_ingest, "read_workbook", pytest.fail)
+    pd.testing.assert_frame_equal(load(workbook, cache_dir=cache_dir), first, check_dtype=False)
+
+
+def test_load_parses_again_when_the_cache_is_unreadable(workbook, tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    first = load(workbook, cache_dir=cache_dir)
+    with open(cache_path(workbook, cache_dir=cache_dir), "wb") as handle:
+        handle.write(b"not a cache")
+    pd.testing.assert_frame_equal(load(workbook, cache_dir=cache_dir), first, check_dtype=False)
+
+
+def test_cache_key_follows_the_groups(workbook):
+    assert cache_path(workbook) != cache_path(workbook, groups={"P4": "SOC"})
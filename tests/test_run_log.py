@@ -0,0 +1,81 @@
+"""JSONL run log: one event per operation, written even when it fails."""
+
+import json
+
+import pytest
+
+
+def ticking_clock():
+    ticks = iter(range(0, 1000, 5))
+    return lambda: next(ticks)
+
+
+def read_events(path):
+    with open(path) as handle:
+        return [json.loads(line) for line in handle]
+
+
+def test_record_writes_one_event_per_operation(protocol, tmp_path):
+    path = str(tmp_path / "logs" / "run.jsonl")
+    run_log = protocol.RunLog(path, clock=ticking_clock())
+    run_log.plate, run_log.step = "A", 1
+    with run_log.record("transfer", reagent="beads", wells=["A1"]) as event:
+        event["touches"] = 4
+    (written,) = read_events(path)
+    assert written == {"op": "transfer", "plate": "A", "step": 1, "start": 5, "reagent": "beads",
+                       "wells": ["A1"], "touches": 4, "end": 10}
+
+
+def test_record_keeps_the_error_that_stopped_the_operation(protocol, tmp_path):
+    path = str(tmp_path / "run.jsonl")
+    run_log = protocol.RunLog(path, clock=ticking_clock())
+    with pytest.raises(RuntimeError):
+        with run_log.record("wash"):
+            raise RuntimeError("no tips")
+    (written,) = read_events(path)
+    assert written["error"] == "RuntimeError: no tips"
+    assert "end" in written
+
+
+def test_step_summary(protocol):
+    run_log = protocol.RunLog(clock=ticking_clock())
+    run_log.plate, run_log.step = "A", 2
+    with run_log.record("step"):
+        for _ in range(2):
+            with run_log.record("transfer", reagent="detection") as event:
+                event["touches"] = 4
+        with run_log.record("wash"):
+            pass
+    assert run_log.step_summary("A", 2) == (
+        "Step 2 summary: 2 detection transfer(s), 8 touch-tips, 1 wash(es), 0 pause(s), 0.6 min")
+
+
+def test_unwritable_path_keeps_the_run_going(protocol, tmp_path):
+    blocker = tmp_path / "file"
+    blocker.write_text("")
+    run_log = protocol.RunLog(str(blocker / "run.jsonl"))
+    assert run_log.path is None
+    with run_log.record("pause"):
+        pass
+    assert len(run_log.events) == 1
+
+
+def test_checkpoint_names_the_resume_parameters(protocol, tmp_path):
+    run_log = protocol.RunLog(str(tmp_path / "run.jsonl"), clock=ticking_clock())
+    run_log.plate, run_log.step = "B", 2
+    run_log.checkpoint("detection", 4)
+    with open(tmp_path / protocol.CHECKPOINT_FILE) as handle:
+        checkpoint = json.load(handle)
+    assert checkpoint["resume"] == {"resume_from": "2:detection", "resume_index": 5, "resume_plate": 2}
+    assert checkpoint["resume"]["resume_from"] in [choice["value"] for choice in protocol.RESUME_CHOICES]
+    assert protocol.resume_part(checkpoint["resume"]["resume_from"]) == (2, 1)
+
+
+def test_resumed_run_skips_what_the_checkpoint_says_is_done(protocol):
+    from legendplex_timing import DEFAULT_PROTOCOL, record_protocol
+    params = {"incubation": "pause", "resume_from": "2:detection", "resume_index": 5}
+    commands = record_protocol(DEFAULT_PROTOCOL, params, module=protocol).commands
+    assert not [command for command in commands if command.step == "step 1" and command.kind == "aspirate"]
+    detection = [command for command in commands if command.step == "step 2" and command.kind == "pick_up_tip"]
+    # groups 5-12 of the detection antibody, the step 2 wash is done
+    assert len(detection) == 8
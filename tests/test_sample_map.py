@@ -0,0 +1,40 @@
+"""Sample map parsing and the 96>384 layout it drives."""
+
+import os
+
+import pytest
+
+
+def test_parse_sample_map_template(protocol, repo_root):
+    with open(os.path.join(repo_root, "sample_map_template.csv")) as handle:
+        sample_map = protocol.parse_sample_map(handle.read())
+    assert sample_map[1] == "standard"
+    assert sample_map[12] == "blank"
+    assert all(sample_map[column] == "sample" for column in range(2, 12))
+
+
+def test_parse_sample_map_skips_header_comments_and_unlisted_columns(protocol):
+    sample_map = protocol.parse_sample_map("column,content\n# note\n\n1, Standard\n3,sample\n4,\n")
+    assert sample_map[1] == "standard"
+    assert sample_map[3] == "sample"
+    assert sample_map[2] == sample_map[4] == sample_map[12] == "empty"
+
+
+@pytest.mark.parametrize("text", ["13,sample", "2,plasma"])
+def test_parse_sample_map_rejects_bad_rows(protocol, text):
+    with pytest.raises(ValueError):
+        protocol.parse_sample_map(text)
+
+
+@pytest.mark.parametrize("text", ["column,content\n", "1,empty\n2,\n"])
+def test_empty_sample_map_is_rejected(protocol, text):
+    with pytest.raises(ValueError, match="nothing to run"):
+        protocol.PlateLayout(protocol.parse_sample_map(text))
+
+
+def test_layout_visits_occupied_columns_only(layout):
+    plate = layout("standard", "empty", "sample", "blank")
+    assert len(plate.occupied_groups()) == 3
+    # 96 source column c lands in 384 columns 2c-1 and 2c
+    assert plate.groups_for("sample") == [["A5", "A6", "B5", "B6"]]
+    assert plate.groups_for("standard", "blank") == [["A1", "A2", "B1", "B2"], ["A7", "A8", "B7", "B8"]]
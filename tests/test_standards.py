@@ -0,0 +1,61 @@
+"""On deck standard curve: the dilution series and its single tips."""
+
+import pytest
+
+
+def all_picks(plan, reagent=None):
+    return [pick for reagent_pass in plan["passes"] if reagent in (None, reagent_pass["reagent"])
+            for pick in reagent_pass["picks"]]
+
+
+def test_plan_standards_series(protocol):
+    plan = protocol.plan_standards(7, 10000, 4, [1])
+    concentrations = [row["concentration"] for row in plan["rows"]]
+    assert concentrations[:7] == pytest.approx([10000 / 4 ** n for n in range(7)])
+    assert concentrations[7] == 0.0
+    assert plan["transfer"] == pytest.approx(plan["well_volume"] / 3, abs=0.1)
+    assert plan["top_volume"] == pytest.approx(plan["well_volume"] + plan["transfer"])
+    assert sum(plan["buffer_trips"]) == pytest.approx(plan["well_volume"])
+    assert max(plan["buffer_trips"] + plan["transfer_trips"]) <= protocol.STANDARD_PREP["tip_volume"]
+    assert plan["tips"] == 7
+
+
+def test_plan_standards_scales_with_standard_columns(protocol):
+    one, two = (protocol.plan_standards(8, 10000, 4, columns) for columns in ([1], [1, 2]))
+    assert two["tips"] == 2 * one["tips"]
+    assert two["seconds"] == 2 * one["seconds"]
+
+
+@pytest.mark.parametrize("points, columns", [(7, []), (7, [4]), (9, [1]), (1, [1])])
+def test_plan_standards_rejects(protocol, points, columns):
+    with pytest.raises(ValueError):
+        protocol.plan_standards(points, 10000, 4, columns)
+
+
+def test_standards_take_a_free_column(protocol, layout):
+    plan = protocol.plan_tips(layout("standard", "sample", "sample", "blank"), "column", standards=True)
+    assert plan["refresh"] is None
+    assert plan["clashes"] == []
+    (pick,) = all_picks(plan, "standards")
+    assert pick not in all_picks(plan, "matrix") + all_picks(plan, "buffer") + all_picks(plan, "beads")
+    # single tips only from racks the A1 nozzle reaches
+    assert protocol.single_clashes(pick[0], set(protocol.DECK_LAYOUT["reagent_tips"])) == []
+
+
+def test_standards_on_a_full_plate_refresh_a_rack(protocol, layout):
+    plan = protocol.plan_tips(layout("standard", *("sample",) * 11), "column", standards=True)
+    assert plan["clashes"] == []
+    refresh = plan["refresh"]
+    assert refresh in protocol.DECK_LAYOUT["reagent_tips"]
+    assert [slot for slot, _ in all_picks(plan, "standards")] == [refresh]
+    # the rack is untouched before the standard curve and full again for the beads
+    assert all(slot != refresh for slot, _ in all_picks(plan, "matrix") + all_picks(plan, "buffer"))
+    assert all_picks(plan, "standards")[0] in all_picks(plan, "beads")
+
+
+def test_standards_sources_within_single_tip_reach(protocol, layout):
+    plan = protocol.plan_tips(layout("standard", "sample"), "column", standards=True)
+    assert not [clash for clash in plan["clashes"] if clash[0] == "standards"]
+    racks = set(protocol.DECK_LAYOUT["reagent_tips"])
+    for slot in (protocol.DECK_LAYOUT["source"], protocol.DECK_LAYOUT["reagent_plate"]):
+        assert protocol.single_clashes(slot, racks, first_columns=True) == []
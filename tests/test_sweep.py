@@ -0,0 +1,51 @@
+"""Sweep value parsing and the settings each combination sets."""
+
+import pytest
+
+from legendplex_sweep import combinations, parse_sweep, parse_values
+from legendplex_timing import protocol_parameters
+
+
+def test_parse_values_list_and_range():
+    assert parse_values("1, 2.5,") == [1, 2.5]
+    assert parse_values("0.5:1.5:0.5") == [0.5, 1, 1.5]
+    with pytest.raises(ValueError):
+        parse_values("1:2:0")
+
+
+def test_parse_sweep_needs_values():
+    with pytest.raises(SystemExit):
+        parse_sweep(["wash_tips"])
+
+
+def test_str_parameters_keep_their_type(protocol):
+    # wash_tips is a str choice keyed "200" / "1000"; an int would miss WASH_TIPRACKS
+    entries = list(combinations(parse_sweep(["wash_tips=200,1000"]), protocol))
+    values = [protocol_parameters(protocol, params)["wash_tips"] for _, params, _ in entries]
+    assert values == ["200", "1000"]
+    assert all(value in protocol.WASH_TIPRACKS for value in values)
+
+
+def test_numeric_parameters_get_their_declared_type(protocol):
+    sweep = parse_sweep(["standard_points=3,4", "standard_factor=2:3:1"])
+    values = [protocol_parameters(protocol, params) for _, params, _ in combinations(sweep, protocol)]
+    assert {value["standard_points"] for value in values} == {3, 4}
+    assert all(isinstance(value["standard_points"], int) for value in values)
+    assert all(isinstance(value["standard_factor"], float) for value in values)
+
+
+def test_bad_parameter_value_stops_the_sweep(protocol):
+    with pytest.raises(SystemExit):
+        list(combinations(parse_sweep(["standard_points=2.5"]), protocol))
+
+
+def test_named_setting_writes_its_table_paths(protocol):
+    (_, params, overrides), = combinations(parse_sweep(["sample_rate=0.5"]), protocol)
+    assert params == {}
+    assert overrides == [("LIQUID_CLASSES.standard.dispense_rate", 0.5),
+                         ("LIQUID_CLASSES.sample.dispense_rate", 0.5)]
+
+
+def test_unknown_setting(protocol):
+    with pytest.raises(SystemExit):
+        list(combinations(parse_sweep(["no_such_setting=1"]), protocol))
@@ -0,0 +1,59 @@
+"""The recording context and the duration estimate built from it."""
+
+import pytest
+
+from legendplex_timing import (DEFAULT_PROTOCOL, RecordingProtocolContext, SimulationError, TimingModel,
+                               command_seconds, estimate, record_protocol)
+
+
+def deck():
+    context = RecordingProtocolContext()
+    tips = context.load_labware("opentrons_flex_96_tiprack_200ul", "A2")
+    plate = context.load_labware("corning_96_wellplate_360ul_flat", "C2")
+    context.load_trash_bin("A3")
+    return context, context.load_instrument("flex_96channel_1000", "left", tip_racks=[tips]), plate
+
+
+def test_step_comments_split_the_estimate():
+    context, pipette, plate = deck()
+    context.comment("STEP 1 commencing")
+    pipette.pick_up_tip()
+    pipette.aspirate(100, plate["A1"])
+    context.comment("STEP 2 commencing")
+    pipette.dispense(100, plate["A1"])
+    pipette.drop_tip()
+    context.delay(seconds=30)
+    result = estimate(context.commands)
+    assert list(result.per_step) == ["step 1", "step 2"]
+    assert sum(result.per_step.values()) == pytest.approx(result.total)
+    assert result.per_kind["delay"]["seconds"] == 30
+
+
+def test_liquid_time_follows_volume_and_rate():
+    context, pipette, plate = deck()
+    pipette.pick_up_tip()
+    pipette.aspirate(160, plate["A1"])
+    pipette.dispense(160, plate["A1"], rate=0.5)
+    model = TimingModel()
+    aspirate, dispense = (command_seconds(model, command) for command in context.commands[1:])
+    # 160 uL at the 160 uL/s default flow rate, then at half the rate
+    assert aspirate == pytest.approx(model.liquid_overhead + 1.0)
+    assert dispense == pytest.approx(model.liquid_overhead + 2.0)
+
+
+@pytest.mark.parametrize("action", [
+    lambda pipette, plate: pipette.aspirate(10, plate["A1"]),
+    lambda pipette, plate: (pipette.pick_up_tip(), pipette.aspirate(250, plate["A1"])),
+    lambda pipette, plate: (pipette.pick_up_tip(), pipette.drop_tip(), pipette.pick_up_tip()),
+])
+def test_moves_the_robot_would_reject(action):
+    _, pipette, plate = deck()
+    with pytest.raises(SimulationError):
+        action(pipette, plate)
+
+
+def test_full_protocol_records_every_step(protocol):
+    result = estimate(record_protocol(DEFAULT_PROTOCOL, {"incubation": "pause"}, module=protocol).commands)
+    assert [step for step in result.per_step if step.startswith("step")] == ["step 1", "step 2", "step 3", "step 4"]
+    assert result.per_kind["pick_up_tip"]["count"] > 0
+    assert 15 * 60 < result.total < 120 * 60
@@ -0,0 +1,50 @@
+"""Reagent tip plans: racks, nozzle starts and rack columns of every pass."""
+
+import pytest
+
+FULL_PLATE = ("standard",) + ("sample",) * 11
+
+
+def all_picks(plan, reagent=None):
+    return [pick for reagent_pass in plan["passes"] if reagent in (None, reagent_pass["reagent"])
+            for pick in reagent_pass["picks"]]
+
+
+def test_find_clashes(protocol):
+    assert protocol.find_clashes(["B2", "B1"], "A12", {"B1"}) == [("B2", "B1")]
+    assert protocol.find_clashes(["B2", "B1"], "A1", {"B1"}) == []
+    # column 3 has no slot to its right
+    assert protocol.find_clashes(["B3"], "A1", {"B1", "C3"}) == []
+
+
+def test_plan_tips_full_plate_fits_the_racks(protocol, layout):
+    plan = protocol.plan_tips(layout(*FULL_PLATE), "column")
+    assert plan["racks"] == protocol.DECK_LAYOUT["reagent_tips"]
+    assert plan["clashes"] == []
+    picks = all_picks(plan)
+    assert len(picks) == len(set(picks)) == 48
+
+
+def test_plan_tips_partial_map_loads_fewer_racks(protocol, layout):
+    plan = protocol.plan_tips(layout("standard", "sample", "sample", "blank"), "column")
+    assert len(plan["racks"]) == 2
+    assert plan["clashes"] == []
+    assert len(all_picks(plan)) == len(set(all_picks(plan))) == 1 + 3 + 3 * 4
+
+
+def test_plan_tips_too_few_rack_slots(protocol, layout):
+    deck = dict(protocol.DECK_LAYOUT, reagent_tips=protocol.DECK_LAYOUT["reagent_tips"][:3])
+    with pytest.raises(ValueError):
+        protocol.plan_tips(layout(*FULL_PLATE), "column", deck=deck)
+
+
+def test_plan_tips_full_mode_one_rack_per_pass(protocol, layout):
+    plan = protocol.plan_tips(layout(*FULL_PLATE), "full")
+    assert [reagent_pass["picks"] for reagent_pass in plan["passes"]] == [
+        [(slot, 1)] for slot in protocol.DECK_LAYOUT["reagent_tips"]]
+
+
+def test_plan_tips_separate_steps_start_new_racks(protocol, layout):
+    plan = protocol.plan_tips(layout("standard", "sample", "sample", "blank"), "column", separate_steps=True)
+    racks = {reagent_pass["step"]: {slot for slot, _ in reagent_pass["picks"]} for reagent_pass in plan["passes"]}
+    assert racks[1].isdisjoint(racks[2]) and racks[2].isdisjoint(racks[3])
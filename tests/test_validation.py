@@ -0,0 +1,35 @@
+"""Validation (water) runs: the column groups a reduced run keeps."""
+
+import pytest
+
+
+@pytest.mark.parametrize("count, keep, groups", [
+    (12, 3, [1, 7, 12]),
+    (12, 1, [1]),
+    (12, 2, [1, 12]),
+    (12, 12, list(range(1, 13))),
+    (4, 6, [1, 2, 3, 4]),
+])
+def test_representative_groups(protocol, count, keep, groups):
+    assert protocol.representative_groups(count, keep) == groups
+
+
+@pytest.mark.parametrize("keep", range(1, 13))
+def test_representative_groups_span_the_plate(protocol, keep):
+    groups = protocol.representative_groups(12, keep)
+    assert len(groups) == keep
+    assert groups[0] == 1
+    assert keep == 1 or groups[-1] == 12
+
+
+def test_validation_run_keeps_the_vacuum_pauses(protocol):
+    from legendplex_timing import DEFAULT_PROTOCOL, record_protocol
+    params = {"incubation": "timer", "run_mode": "validation", "validation_groups": 3}
+    commands = record_protocol(DEFAULT_PROTOCOL, params, module=protocol).commands
+    pauses = [command.message for command in commands if command.kind == "pause"]
+    assert pauses and all("vacuum" in message.lower() for message in pauses)
+    incubations = [command.seconds for command in commands if command.kind == "delay" and "Incubating" in command.message]
+    assert sum(incubations) == sum(protocol.INCUBATION_MINUTES.values()) * protocol.VALIDATION_SECONDS_PER_MINUTE
+    # one bead mix in the reservoir per column group run
+    beads = [command for command in commands if command.kind == "mix" and command.load_name == "nest_12_reservoir_15ml"]
+    assert len(beads) == 3
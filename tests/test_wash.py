@@ -0,0 +1,51 @@
+"""Wash plans: reservoir trips that fit the wash tips."""
+
+import pytest
+
+
+def dispenses(plan):
+    return [dispense for trip in plan["trips"] for dispense in trip["dispenses"]]
+
+
+@pytest.mark.parametrize("tip_volume", [200, 1000])
+def test_plan_wash_fits_tips_and_covers_every_round(protocol, tip_volume):
+    plan = protocol.plan_wash(4, 40, tip_volume, final_volume=20)
+    capacity = tip_volume * protocol.WASH_TIP_FILL
+    assert all(trip["load"] <= capacity for trip in plan["trips"])
+    assert [(cycle, quadrant) for cycle, quadrant, _ in dispenses(plan)] == [
+        (cycle, quadrant) for cycle in range(1, 6) for quadrant in range(4)]
+    assert [volume for cycle, _, volume in dispenses(plan) if cycle == 5] == [20] * 4
+    # later trips top up the residual left in the tips
+    assert plan["trips"][0]["aspirate"] == plan["trips"][0]["load"]
+    assert all(trip["aspirate"] == trip["load"] - plan["residual"] for trip in plan["trips"][1:])
+
+
+def test_plan_wash_1000ul_tips_take_one_trip(protocol):
+    assert len(protocol.plan_wash(4, 40, 1000)["trips"]) == 1
+    assert len(protocol.plan_wash(4, 40, 200)["trips"]) > 1
+
+
+def test_plan_wash_rejects_a_dispense_larger_than_the_tip(protocol):
+    with pytest.raises(ValueError):
+        protocol.plan_wash(1, 190, 200)
+
+
+def test_resume_wash_keeps_round_numbers(protocol):
+    plan = protocol.plan_wash(4, 40, 200)
+    assert protocol.resume_wash(plan, 1) is plan
+    resumed = protocol.resume_wash(plan, 3)
+    assert sorted({cycle for cycle, _, _ in dispenses(resumed)}) == [3, 4]
+    assert resumed["cycles"] == 4
+    assert resumed["first_round"] == 3
+    # the first trip of a resumed wash starts from empty tips
+    assert resumed["trips"][0]["aspirate"] == resumed["trips"][0]["load"]
+
+
+def test_resume_wash_at_the_final_resuspension(protocol):
+    plan = protocol.plan_wash(4, 40, 200, final_volume=20)
+    assert dispenses(protocol.resume_wash(plan, 5)) == [(5, quadrant, 20) for quadrant in range(4)]
+    assert protocol.resume_wash(plan, 6) is None
+
+
+def test_resume_wash_past_the_last_round(protocol):
+    assert protocol.resume_wash(protocol.plan_wash(4, 40, 200), 5) is None